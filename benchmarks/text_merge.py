@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Benchmark the throughput of dsutil.text.merge (with plain and gzip outputs).
+"""
+from pathlib import Path
+from argparse import ArgumentParser, Namespace
+import tempfile
+import functools
+import time
+import dsutil.text
+
+
+def _generate_files(dir_: Path, num_files: int, size: int) -> list:
+    """Generate CSV files with headers.
+
+    :param dir_: The directory to generate files in.
+    :param num_files: The number of files to generate.
+    :param size: The approximate size (in bytes) of each file.
+    :return: A list of paths of generated files.
+    """
+    line = b"1234567890,abcdefghijklmnopqrstuvwxyz,3.1415926\n"
+    content = b"id,name,value\n" + line * (size // len(line))
+    files = []
+    for idx in range(num_files):
+        file = dir_ / f"part-{idx:05d}.csv"
+        file.write_bytes(content)
+        files.append(file)
+    return files
+
+
+def _merge_line_by_line(files: list, output: Path) -> None:
+    """The line-by-line merging implementation as the baseline.
+    """
+    with open(output, "wb") as out:
+        with open(files[0], "rb") as fin0:
+            for line in fin0:
+                out.write(line)
+        for file in files[1:]:
+            with open(file, "rb") as fin:
+                fin.readline()
+                for line in fin:
+                    out.write(line)
+
+
+def _report(name: str, func, files: list, output: Path) -> None:
+    size = sum(file.stat().st_size for file in files)
+    begin = time.perf_counter()
+    func(files, output)
+    seconds = time.perf_counter() - begin
+    print(
+        f"{name}: {size / 1E6:,.0f} MB in {seconds:.2f}s ({size / 1E6 / seconds:,.0f} MB/s)"
+    )
+
+
+def parse_args(args=None, namespace=None) -> Namespace:
+    """Parse command-line arguments.
+
+    :param args: The arguments to parse. 
+        If None, the arguments from command-line are parsed.
+    :param namespace: An inital Namespace object.
+    :return: A namespace object containing parsed options.
+    """
+    parser = ArgumentParser(
+        description="Benchmark the throughput of dsutil.text.merge."
+    )
+    parser.add_argument(
+        "-n",
+        dest="num_files",
+        type=int,
+        default=20,
+        help="The number of files to merge."
+    )
+    parser.add_argument(
+        "-s",
+        dest="size",
+        type=int,
+        default=50,
+        help="The size (in megabytes) of each file."
+    )
+    parser.add_argument(
+        "-w",
+        dest="workers",
+        type=int,
+        default=8,
+        help="The number of threads for merging files in parallel."
+    )
+    parser.add_argument(
+        "-d", dest="dir", default=None, help="The directory to generate files in."
+    )
+    return parser.parse_args(args=args, namespace=namespace)
+
+
+def main():
+    """The main function for scripting usage.
+    """
+    args = parse_args()
+    with tempfile.TemporaryDirectory(dir=args.dir) as dir_:
+        dir_ = Path(dir_)
+        files = _generate_files(dir_, args.num_files, args.size * 1024**2)
+        output = dir_ / "merged.csv"
+        _report("line by line", _merge_line_by_line, files, output)
+        _report("dsutil.text.merge", dsutil.text.merge, files, output)
+        _report(
+            f"dsutil.text.merge ({args.workers} threads)",
+            functools.partial(dsutil.text.merge, workers=args.workers), files, output
+        )
+        output = dir_ / "merged.csv.gz"
+        _report("dsutil.text.merge (gzip)", dsutil.text.merge, files, output)
+        _report(
+            f"dsutil.text.merge (gzip, {args.workers} threads)",
+            functools.partial(dsutil.text.merge, threads=args.workers), files, output
+        )
+
+
+if __name__ == "__main__":
+    main()
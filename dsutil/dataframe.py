@@ -1,10 +1,35 @@
 """Pandas DataFrame related utils.
 """
-from typing import List, Union
+from typing import Any, Callable, List, Dict, Iterator, Sequence, Union
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import math
+import json
+import html
+import os
+import re
+import time
+import pickle
+import functools
+import uuid
+import hashlib
+import shutil
+import tempfile
+import warnings
 from loguru import logger
+import numpy as np
 import pandas as pd
-from pandas_profiling import ProfileReport
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .profiling import profile_memory
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+CACHE_DIR = Path.home() / ".cache" / "dsutil"
+HIVE_DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+# numbers which are written canonically (no sign "+", leading zeros or spaces)
+# and thus survive a round trip through a numeric dtype
+CANONICAL_NUMBER = r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?"
 
 
 def table_2w(
@@ -34,32 +59,238 @@ def table_2w(
     raise TypeError('"frame" must be pandas.Series or pandas.DataFrame.')
 
 
-def read_csv(path: Union[str, Path], **kwargs) -> pd.DataFrame:
+@profile_memory
+def read_csv(path: Union[str, Path], optimize: bool = False, **kwargs) -> pd.DataFrame:
     """Read many CSV files into a DataFrame at once.
 
     :param path: A path to a CSV file or to a directory containing CSV files.
+    :param optimize: If true, optimize dtypes of the DataFrame (see optimize_dtypes).
     :param kwargs: Additional arguments to pass to pandas::read_csv.
     :return: A pandas DataFrame.
     """
     if isinstance(path, str):
         path = Path(path)
     if path.is_file():
-        return pd.read_csv(path, **kwargs)
-    return pd.concat(pd.read_csv(csv, **kwargs) for csv in path.glob("*.csv"))
+        frame = pd.read_csv(path, **kwargs)
+    else:
+        frame = pd.concat(pd.read_csv(csv, **kwargs) for csv in path.glob("*.csv"))
+    if optimize:
+        frame = optimize_dtypes(frame)
+    return frame
+
+
+def _downcast_numeric(col: pd.Series) -> pd.Series:
+    """Downcast a numeric column to the smallest dtype which holds its values losslessly.
+
+    :param col: A numeric pandas Series.
+    :return: The downcasted Series.
+    """
+    if pd.api.types.is_bool_dtype(col):
+        return col
+    if pd.api.types.is_integer_dtype(col):
+        return pd.to_numeric(col, downcast="integer")
+    if pd.api.types.is_float_dtype(col) and col.dtype.itemsize > 4:
+        col32 = col.astype(np.float32)
+        if ((col32 == col) | col.isna()).all():
+            return col32
+    return col
+
+
+def _parse_strings(col: pd.Series) -> pd.Series:
+    """Parse a column of strings as numbers or datetimes if all non-null values can be parsed.
+    Strings are parsed as numbers only if they are written canonically
+    so that no information (e.g., leading zeros) is lost.
+
+    :param col: A pandas Series of strings.
+    :return: The parsed Series (or the original Series if it cannot be parsed).
+    """
+    notna = col.notna()
+    strs = col[notna].astype(str)
+    # zero-padded codes (e.g., ZIP codes "02139") are kept as strings
+    if strs.str.fullmatch(CANONICAL_NUMBER).all():
+        nums = pd.to_numeric(col, errors="coerce")
+        if nums.notna().sum() == notna.sum():
+            return _downcast_numeric(nums)
+    sample = strs.head(100)
+    if sample.empty or not sample.str.contains(r"\d").all():
+        return col
+    if sample.str.fullmatch(r"\d+").any():
+        return col
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        if pd.to_datetime(sample, errors="coerce").isna().any():
+            return col
+        dts = pd.to_datetime(col, errors="coerce")
+    if dts.notna().sum() == notna.sum():
+        return dts
+    return col
+
+
+def optimize_dtypes(
+    frame: pd.DataFrame,
+    category_ratio: float = 0.5,
+    parse_strings: bool = True
+) -> pd.DataFrame:
+    """Reduce the memory usage of a DataFrame by optimizing dtypes of its columns.
+    Numeric columns are downcasted to the smallest dtypes holding their values losslessly,
+    string columns are parsed as numbers or datetimes if possible,
+    and low-cardinality string columns are converted to categoricals.
+    Memory usage before and after the optimization is logged.
+
+    :param frame: A pandas DataFrame.
+    :param category_ratio: A string column is converted to categorical
+        if its ratio of distinct values to non-null values is no larger than this value.
+    :param parse_strings: If true, parse string columns as numbers or datetimes.
+    :return: A new DataFrame with optimized dtypes.
+    """
+    bytes_before = frame.memory_usage(deep=True).sum()
+    columns = []
+    for idx in range(frame.shape[1]):
+        col = frame.iloc[:, idx]
+        if pd.api.types.is_numeric_dtype(col):
+            col = _downcast_numeric(col)
+        elif pd.api.types.is_object_dtype(col) or pd.api.types.is_string_dtype(col):
+            if parse_strings:
+                col = _parse_strings(col)
+            if not (
+                pd.api.types.is_numeric_dtype(col) or
+                pd.api.types.is_datetime64_any_dtype(col)
+            ):
+                count = col.count()
+                if count and col.nunique() <= count * category_ratio:
+                    col = col.astype("category")
+        columns.append(col)
+    if not columns:
+        return frame.copy()
+    optimized = pd.concat(columns, axis=1, keys=range(len(columns)))
+    optimized.columns = frame.columns
+    bytes_after = optimized.memory_usage(deep=True).sum()
+    logger.info(
+        "Memory usage of the DataFrame: {:,} bytes before and {:,} bytes after optimization.",
+        bytes_before, bytes_after
+    )
+    return optimized
+
+
+def _fingerprint(data: Union[pd.DataFrame, Path], *args) -> str:
+    """Compute a fingerprint of a DataFrame (based on its content)
+    or of a file/directory (based on paths, sizes and modification times).
+
+    :param data: A pandas DataFrame or the path to a file/directory.
+    :param args: Additional (repr-able) objects to include in the fingerprint.
+    :return: The fingerprint as a hex string.
+    """
+    md5 = hashlib.md5()
+    if isinstance(data, pd.DataFrame):
+        md5.update(repr(list(zip(data.columns, data.dtypes))).encode())
+        md5.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    else:
+        paths = sorted(data.rglob("*")) if data.is_dir() else [data]
+        for path in paths:
+            stat = path.stat()
+            md5.update(f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    for arg in args:
+        md5.update(repr(arg).encode())
+    return md5.hexdigest()
 
 
+def _cache_key(data: Union[pd.DataFrame, Path], cache_dir: Union[str, Path],
+               *args) -> Union[Path, None]:
+    """Get the cache directory corresponding to (the fingerprint of) the data.
+
+    :param data: A pandas DataFrame or the path to a file/directory.
+    :param cache_dir: The root cache directory. If empty, caching is disabled.
+    :param args: Additional (repr-able) objects to include in the fingerprint.
+    :return: The cache directory for the data or None if caching is disabled
+        or if the data cannot be fingerprinted.
+    """
+    if not cache_dir:
+        return None
+    try:
+        return Path(cache_dir) / _fingerprint(data, *args)
+    except (TypeError, ValueError) as err:
+        logger.warning(
+            "Caching is disabled as the data cannot be fingerprinted: {}", err
+        )
+        return None
+
+
+def _load_cached_reports(
+    cache: Union[Path, None], output_dir: Path, files: Sequence[str]
+) -> bool:
+    """Copy cached reports into the output directory.
+
+    :param cache: The cache directory of the reports (or None if caching is disabled).
+    :param output_dir: The output directory for reports.
+    :param files: Names of the report files.
+    :return: True if the reports are found in the cache and False otherwise.
+    """
+    if cache is None or not all((cache / file).is_file() for file in files):
+        return False
+    logger.info("Loading cached reports from {}...", cache)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for file in files:
+        shutil.copy2(cache / file, output_dir / file)
+    return True
+
+
+def _save_cached_reports(
+    cache: Union[Path, None], output_dir: Path, files: Sequence[str]
+) -> None:
+    """Save reports in the output directory into the cache (atomically).
+
+    :param cache: The cache directory of the reports (or None if caching is disabled).
+    :param output_dir: The output directory containing reports.
+    :param files: Names of the report files.
+    """
+    if cache is None:
+        return
+    cache.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=cache.parent, prefix=".tmp-"))
+    for file in files:
+        shutil.copy2(output_dir / file, tmp_dir / file)
+    try:
+        tmp_dir.rename(cache)
+    except OSError:
+        # another process has cached the same reports
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+@profile_memory
 def dump_profile(
-    df: Union[pd.DataFrame, str, Path], title: str, output_dir: Union[str, Path]
+    df: Union[pd.DataFrame, str, Path],
+    title: str,
+    output_dir: Union[str, Path],
+    cache_dir: Union[str, Path] = CACHE_DIR / "profile"
 ):
     """Run pandas profiling on a DataFrame and dump the report into files.
+    The profile is computed only once and then exported to HTML, JSON and Pickle
+    one after another rather than concurrently:
+    the report computes its statistics and HTML lazily on first access (without locking),
+    so concurrent exports would race to compute them,
+    and exporting is CPU-bound Python code holding the GIL, so threads would not help.
+    Reports are cached by the fingerprint of the input
+    (path, size and modification time of a file or content of a DataFrame)
+    and the version of pandas-profiling
+    so that rerunning on an unchanged input returns instantly.
 
     :param df: A pandas DataFrame.
     :param title: The title of the generated report.
     :param output_dir: The output directory for reports.
+    :param cache_dir: The directory for caching reports. If empty, caching is disabled.
     :raises ValueError: If an input file other than Parquet/Pickle/CSV is provided.
     """
+    files = ("report.html", "report.json", "report.pickle")
     if isinstance(df, str):
         df = Path(df)
+    if isinstance(output_dir, str):
+        output_dir = Path(output_dir)
+    import pandas_profiling  # pylint: disable=C0415
+    cache = _cache_key(
+        df, cache_dir, title, "pandas_profiling", pandas_profiling.__version__
+    )
+    if _load_cached_reports(cache, output_dir, files):
+        return
     if isinstance(df, Path):
         logger.info("Reading the DataFrame from {}...", df)
         ext = df.suffix.lower()
@@ -73,14 +304,786 @@ def dump_profile(
             raise ValueError("Only Parquet, Pickle and CSV files are support!")
     logger.info("Shape of the DataFrame: {}", df.shape)
     logger.info("Profiling the DataFrame...")
-    report = ProfileReport(df, title=title, minimal=True, explorative=True)
+    report = pandas_profiling.ProfileReport(
+        df, title=title, minimal=True, explorative=True
+    )
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # statistics and the HTML are computed once and cached by the report,
+    # so writing the outputs one after another does no duplicate work
+    logger.info("Dumping the report to HTML, JSON and Pickle...")
+    (output_dir / "report.html").write_text(report.to_html(), encoding="utf-8")
+    (output_dir / "report.json").write_text(report.to_json(), encoding="utf-8")
+    report.dump(output_dir / "report.pickle")
+    _save_cached_reports(cache, output_dir, files)
+
+
+class Moments:
+    """Mergeable running moments (count, mean, variance, min and max) of numeric values.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values: np.ndarray) -> "Moments":
+        """Update the moments with an array of (non-null) numeric values.
+
+        :param values: A 1-d numpy array of numeric values.
+        :return: The updated Moments object itself.
+        """
+        if values.size == 0:
+            return self
+        other = Moments()
+        other.count = values.size
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean)**2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        return self.merge(other)
+
+    def merge(self, other: "Moments") -> "Moments":
+        """Merge another Moments object into this one (Chan's parallel algorithm).
+
+        :param other: Another Moments object.
+        :return: The merged Moments object itself.
+        """
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def std(self) -> float:
+        """The sample standard deviation.
+        """
+        if self.count < 2:
+            return math.nan
+        return math.sqrt(self.m2 / (self.count - 1))
+
+
+class QuantileSketch:
+    """A mergeable (KLL-style) sketch for approximate quantiles.
+    Items on level h carry a weight of 2^h
+    and a level is compacted (every other sorted item is promoted to the next level)
+    once it holds more than k items.
+    """
+    def __init__(self, k: int = 256):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self._offset = 0
+
+    def update(self, values: np.ndarray) -> "QuantileSketch":
+        """Update the sketch with an array of (non-null) numeric values.
+
+        :param values: A 1-d numpy array of numeric values.
+        :return: The updated QuantileSketch object itself.
+        """
+        self.levels[0] = np.concatenate([self.levels[0], values.astype(float)])
+        self._compact()
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Merge another QuantileSketch object into this one.
+
+        :param other: Another QuantileSketch object.
+        :return: The merged QuantileSketch object itself.
+        """
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self._compact()
+        return self
+
+    def _compact(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if items.size > self.k:
+                items = np.sort(items)
+                # an odd item out stays on the current level
+                self.levels[level] = items[items.size - items.size % 2:]
+                promoted = items[self._offset:items.size - items.size % 2:2]
+                self._offset ^= 1
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate(
+                    [self.levels[level + 1], promoted]
+                )
+            level += 1
+
+    def quantiles(self, qs: Sequence[float]) -> List[float]:
+        """Get approximate quantiles.
+
+        :param qs: A sequence of probabilities (between 0 and 1).
+        :return: A list of approximate quantiles corresponding to the probabilities.
+        """
+        items = np.concatenate(self.levels)
+        if items.size == 0:
+            return [math.nan] * len(qs)
+        weights = np.concatenate(
+            [np.full(level.size, 2.0**h) for h, level in enumerate(self.levels)]
+        )
+        order = np.argsort(items, kind="stable")
+        items = items[order]
+        cumsum = np.cumsum(weights[order])
+        index = np.searchsorted(cumsum, np.asarray(qs) * cumsum[-1])
+        return items[np.minimum(index, items.size - 1)].tolist()
+
+
+class HyperLogLog:
+    """A mergeable HyperLogLog sketch for approximate distinct counts.
+    """
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray) -> "HyperLogLog":
+        """Update the sketch with 64-bit hashes of values.
+
+        :param hashes: A 1-d numpy array of uint64 hashes.
+        :return: The updated HyperLogLog object itself.
+        """
+        bits = 64 - self.p
+        index = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # the rank is the position of the leftmost 1-bit in the remaining bits
+        with np.errstate(divide="ignore"):
+            rank = bits - np.floor(np.log2(rest.astype(float)))
+        rank[rest == 0] = bits + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Merge another HyperLogLog object into this one.
+
+        :param other: Another HyperLogLog object with the same precision.
+        :return: The merged HyperLogLog object itself.
+        """
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        """Estimate the number of distinct values.
+
+        :return: The approximate number of distinct values.
+        """
+        m = self.registers.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2.0**-self.registers.astype(float))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # small range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class TopK:
+    """A mergeable (Misra-Gries) summary of the most frequent values.
+    Counts are lower bounds of the true frequencies.
+    """
+    def __init__(self, k: int = 10, capacity: int = 0):
+        self.k = k
+        self.capacity = capacity if capacity > 0 else max(10 * k, 100)
+        self.counts = {}
+
+    def update(self, values: pd.Series) -> "TopK":
+        """Update the summary with (non-null) values.
+
+        :param values: A pandas Series of non-null values.
+        :return: The updated TopK object itself.
+        """
+        other = TopK(self.k, self.capacity)
+        vc = values.value_counts()
+        if vc.size > self.capacity:
+            threshold = vc.iloc[self.capacity]
+            vc = vc[vc > threshold] - threshold
+        other.counts = dict(zip(vc.index, vc.tolist()))
+        return self.merge(other)
+
+    def merge(self, other: "TopK") -> "TopK":
+        """Merge another TopK object into this one.
+
+        :param other: Another TopK object.
+        :return: The merged TopK object itself.
+        """
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        if len(self.counts) > self.capacity:
+            threshold = sorted(self.counts.values(), reverse=True)[self.capacity]
+            self.counts = {
+                value: count - threshold
+                for value, count in self.counts.items() if count > threshold
+            }
+        return self
+
+    def top(self) -> List[tuple]:
+        """Get the most frequent values.
+
+        :return: A list of (value, count) tuples sorted by count descendingly.
+        """
+        return sorted(self.counts.items(), key=lambda item: -item[1])[:self.k]
+
+
+class ColumnProfile:
+    """Mergeable statistics of a column.
+    """
+    def __init__(self, name: str, top_k: int = 10):
+        self.name = name
+        self.dtypes = set()
+        self.count = 0
+        self.nulls = 0
+        self.moments = Moments()
+        self.quantile_sketch = QuantileSketch()
+        self.distinct = HyperLogLog()
+        self.top = TopK(top_k)
+
+    def update(self, series: pd.Series) -> "ColumnProfile":
+        """Update the statistics with a chunk of the column.
+
+        :param series: A chunk of the column as a pandas Series.
+        :return: The updated ColumnProfile object itself.
+        """
+        self.dtypes.add(str(series.dtype))
+        values = series.dropna()
+        self.nulls += series.size - values.size
+        self.count += values.size
+        if values.empty:
+            return self
+        if pd.api.types.is_numeric_dtype(values
+                                        ) and not pd.api.types.is_bool_dtype(values):
+            arr = values.to_numpy(dtype=float)
+            arr = arr[np.isfinite(arr)]
+            self.moments.update(arr)
+            self.quantile_sketch.update(arr)
+        self.distinct.update(pd.util.hash_pandas_object(values, index=False).to_numpy())
+        self.top.update(values)
+        return self
+
+    def merge(self, other: "ColumnProfile") -> "ColumnProfile":
+        """Merge the statistics of another chunk of the column into this one.
+
+        :param other: Another ColumnProfile object of the same column.
+        :return: The merged ColumnProfile object itself.
+        """
+        self.dtypes |= other.dtypes
+        self.count += other.count
+        self.nulls += other.nulls
+        self.moments.merge(other.moments)
+        self.quantile_sketch.merge(other.quantile_sketch)
+        self.distinct.merge(other.distinct)
+        self.top.merge(other.top)
+        return self
+
+    def to_dict(self, quantiles: Sequence[float] = QUANTILES) -> Dict:
+        """Summarize the statistics into a (JSON serializable) dict.
+
+        :param quantiles: Probabilities of the quantiles to report.
+        :return: A dict containing the statistics of the column.
+        """
+        total = self.count + self.nulls
+        stats = {
+            "dtype":
+                "|".join(sorted(self.dtypes)),
+            "count":
+                self.count,
+            "nulls":
+                self.nulls,
+            "null_ratio":
+                self.nulls / total if total else None,
+            "distinct":
+                min(self.distinct.count(), self.count),
+            "top":
+                [
+                    {
+                        "value": _to_builtin(value),
+                        "count": count
+                    } for value, count in self.top.top()
+                ],
+        }
+        if self.moments.count:
+            stats.update(
+                {
+                    "min":
+                        self.moments.min,
+                    "max":
+                        self.moments.max,
+                    "mean":
+                        self.moments.mean,
+                    "std":
+                        None if self.moments.count < 2 else self.moments.std,
+                    "quantiles":
+                        dict(
+                            zip(
+                                (str(q) for q in quantiles),
+                                self.quantile_sketch.quantiles(quantiles)
+                            )
+                        ),
+                }
+            )
+        return stats
+
+
+def _to_builtin(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _iter_chunks(data: Union[pd.DataFrame, str, Path],
+                 chunksize: int) -> Iterator[pd.DataFrame]:
+    """Iterate a DataFrame or (CSV/Parquet/Pickle) files in chunks.
+
+    :param data: A pandas DataFrame, the path to a file
+        or the path to a directory containing CSV/Parquet files.
+    :param chunksize: The number of rows in each chunk.
+    :yield: DataFrames of (at most) chunksize rows.
+    :raises ValueError: If an input file other than Parquet/Pickle/CSV is provided.
+    """
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, data.shape[0], chunksize):
+            yield data.iloc[start:(start + chunksize)]
+        return
+    if isinstance(data, str):
+        data = Path(data)
+    if data.is_dir():
+        files = sorted(
+            path
+            for path in data.iterdir() if path.suffix.lower() in (".csv", ".parquet")
+        )
+        for file in files:
+            yield from _iter_chunks(file, chunksize)
+        return
+    logger.info("Reading the DataFrame from {} in chunks...", data)
+    ext = data.suffix.lower()
+    if ext == ".parquet":
+        for batch in pq.ParquetFile(data).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    elif ext == ".csv":
+        yield from pd.read_csv(data, chunksize=chunksize)
+    elif ext == ".pickle":
+        yield from _iter_chunks(pd.read_pickle(data), chunksize)
+    else:
+        raise ValueError("Only Parquet, Pickle and CSV files are support!")
+
+
+def _profile_series(name: str, series: pd.Series, top_k: int) -> ColumnProfile:
+    return ColumnProfile(name, top_k=top_k).update(series)
+
+
+def profile_columns(
+    data: Union[pd.DataFrame, str, Path],
+    title: str = "",
+    chunksize: int = 100_000,
+    workers: int = 0,
+    top_k: int = 10,
+    quantiles: Sequence[float] = QUANTILES,
+) -> Dict:
+    """Profile columns of a DataFrame (or CSV/Parquet files) in a single streaming pass.
+    Chunks are profiled column by column in a thread pool
+    and the resulting mergeable sketches are combined,
+    so that memory usage is bounded by a few chunks regardless of the size of the data.
+
+    :param data: A pandas DataFrame, the path to a CSV/Parquet/Pickle file
+        or the path to a directory containing CSV/Parquet files.
+    :param title: The title of the report.
+    :param chunksize: The number of rows in each chunk.
+    :param workers: The number of worker threads (0 means the default of ThreadPoolExecutor).
+    :param top_k: The number of most frequent values to report for each column.
+    :param quantiles: Probabilities of the (approximate) quantiles to report.
+    :return: The profiling report as a (JSON serializable) dict.
+    """
+    profiles = {}
+    rows = 0
+
+    def _merge(profile: ColumnProfile):
+        if profile.name in profiles:
+            profiles[profile.name].merge(profile)
+        else:
+            profiles[profile.name] = profile
+
+    with ThreadPoolExecutor(max_workers=workers if workers > 0 else None) as executor:
+        max_pending = executor._max_workers * 4  # pylint: disable=W0212
+        pending = deque()
+        for chunk in _iter_chunks(data, chunksize):
+            rows += chunk.shape[0]
+            for idx, name in enumerate(chunk.columns):
+                pending.append(
+                    executor.submit(
+                        _profile_series, str(name), chunk.iloc[:, idx], top_k
+                    )
+                )
+            while len(pending) > max_pending:
+                _merge(pending.popleft().result())
+        while pending:
+            _merge(pending.popleft().result())
+    return {
+        "title": title,
+        "rows": rows,
+        "columns": len(profiles),
+        "variables":
+            {
+                name: profile.to_dict(quantiles)
+                for name, profile in profiles.items()
+            },
+    }
+
+
+def _profile_to_html(report: Dict) -> str:
+    """Render a profiling report (generated by profile_columns) as HTML.
+
+    :param report: A profiling report generated by profile_columns.
+    :return: The report as a HTML string.
+    """
+    def _row(key, value):
+        if isinstance(value, float):
+            value = f"{value:,.6g}"
+        return f"<tr><th>{html.escape(str(key))}</th><td>{html.escape(str(value))}</td></tr>"
+
+    title = html.escape(report["title"])
+    parts = [
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title>",
+        "<style>body{font-family:sans-serif}table{border-collapse:collapse;margin:8px 0}"
+        "th,td{border:1px solid #ccc;padding:2px 8px;text-align:left}</style></head><body>",
+        f"<h1>{title}</h1><h2>Overview</h2><table>",
+        _row("Number of rows", f"{report['rows']:,}"),
+        _row("Number of columns", report["columns"]),
+        "</table><h2>Variables</h2>",
+    ]
+    for name, stats in report["variables"].items():
+        parts.append(f"<h3>{html.escape(name)}</h3><table>")
+        for key, value in stats.items():
+            if key not in ("top", "quantiles"):
+                parts.append(_row(key, value))
+        for q, value in stats.get("quantiles", {}).items():
+            parts.append(_row(f"quantile {q}", value))
+        parts.append("</table><table><tr><th>Top value</th><th>Count</th></tr>")
+        for item in stats["top"]:
+            parts.append(_row(item["value"], item["count"]))
+        parts.append("</table>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def dump_profile_native(
+    df: Union[pd.DataFrame, str, Path],
+    title: str,
+    output_dir: Union[str, Path],
+    chunksize: int = 100_000,
+    workers: int = 0,
+    top_k: int = 10,
+    cache_dir: Union[str, Path] = CACHE_DIR / "profile"
+) -> Dict:
+    """Profile a DataFrame (or CSV/Parquet files) using the native streaming profiler
+    (see profile_columns) and dump the report into JSON and HTML files.
+    This is a fast and memory-efficient alternative to dump_profile.
+    Reports are cached the same way as dump_profile.
+
+    :param df: A pandas DataFrame, the path to a CSV/Parquet/Pickle file
+        or the path to a directory containing CSV/Parquet files.
+    :param title: The title of the generated report.
+    :param output_dir: The output directory for reports.
+    :param chunksize: The number of rows in each chunk.
+    :param workers: The number of worker threads (0 means the default of ThreadPoolExecutor).
+    :param top_k: The number of most frequent values to report for each column.
+    :param cache_dir: The directory for caching reports. If empty, caching is disabled.
+    :return: The profiling report as a dict.
+    """
+    files = ("report.html", "report.json")
+    if isinstance(df, str):
+        df = Path(df)
     if isinstance(output_dir, str):
         output_dir = Path(output_dir)
-    output_dir.mkdir(exist_ok=True)
-    # dump report
-    logger.info("Dumping the report to HTML...")
-    report.to_file(output_dir / "report.html")
+    cache = _cache_key(df, cache_dir, title, top_k, "native")
+    if _load_cached_reports(cache, output_dir, files):
+        with (output_dir / "report.json").open() as fin:
+            return json.load(fin)
+    logger.info("Profiling the DataFrame...")
+    report = profile_columns(
+        df, title=title, chunksize=chunksize, workers=workers, top_k=top_k
+    )
+    output_dir.mkdir(parents=True, exist_ok=True)
     logger.info("Dumping the report to JSON...")
-    report.to_file(output_dir / "report.json")
-    logger.info("Dumping the report to Pickle...")
-    report.dump(output_dir / "report.pickle")
+    with (output_dir / "report.json").open("w") as fout:
+        json.dump(report, fout, indent=2)
+    logger.info("Dumping the report to HTML...")
+    (output_dir / "report.html").write_text(_profile_to_html(report))
+    _save_cached_reports(cache, output_dir, files)
+    return report
+
+
+def _hash_args(args: tuple, kwargs: Dict[str, Any]) -> str:
+    """Hash (positional and keyword) arguments of a function call.
+
+    :param args: Positional arguments.
+    :param kwargs: Keyword arguments.
+    :return: The MD5 hash of the arguments as a hex string.
+    """
+    key = (args, sorted(kwargs.items()))
+    try:
+        data = pickle.dumps(key, protocol=4)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        data = repr(key).encode()
+    return hashlib.md5(data).hexdigest()
+
+
+def _evict_cache(cache_dir: Path, max_bytes: int) -> None:
+    """Remove least recently used Parquet files so that the cache directory
+    takes no more than the specified number of bytes.
+
+    :param cache_dir: The cache directory.
+    :param max_bytes: The maximum total size (in bytes) of cached Parquet files.
+    """
+    stats = []
+    for path in cache_dir.glob("*.parquet"):
+        try:
+            stats.append((path, path.stat()))
+        except FileNotFoundError:
+            pass
+    stats.sort(key=lambda item: item[1].st_atime, reverse=True)
+    total = 0
+    for path, stat in stats:
+        total += stat.st_size
+        if total > max_bytes:
+            logger.info("Evicting the cached DataFrame {}...", path)
+            path.unlink()
+
+
+def cache_frame(
+    cache_dir: Union[str, Path] = CACHE_DIR / "frame",
+    ttl: float = 0,
+    max_bytes: int = 0
+) -> Callable:
+    """A decorator caching DataFrames returned by a function as Parquet files
+    keyed by the name of the function and a hash of its arguments.
+    The decorated function accepts an extra keyword argument cache_columns
+    which loads only the specified columns from the cache (if cached).
+    The decorated function also has methods invalidate(*args, **kwargs)
+    (removing the cache of the specified arguments) and clear() (removing all caches of the function).
+
+    :param cache_dir: The directory for caching DataFrames.
+    :param ttl: The time to live (in seconds) of cached DataFrames. 0 means never expire.
+    :param max_bytes: The maximum total size (in bytes) of the cache directory.
+        Least recently used DataFrames are evicted when exceeded. 0 means no limit.
+    :return: A decorator.
+    """
+    cache_dir = Path(cache_dir)
+
+    def decorator(func: Callable[..., pd.DataFrame]) -> Callable[..., pd.DataFrame]:
+        prefix = re.sub(r"[^\w.-]", "_", f"{func.__module__}.{func.__qualname__}")
+
+        def _path(args, kwargs) -> Path:
+            return cache_dir / f"{prefix}-{_hash_args(args, kwargs)}.parquet"
+
+        @functools.wraps(func)
+        def wrapper(*args, cache_columns: Union[List[str], None] = None, **kwargs):
+            path = _path(args, kwargs)
+            try:
+                stat = path.stat()
+                if ttl <= 0 or time.time() - stat.st_mtime < ttl:
+                    frame = pd.read_parquet(path, columns=cache_columns)
+                    # update the access time for LRU eviction
+                    os.utime(path, (time.time(), stat.st_mtime))
+                    return frame
+            except FileNotFoundError:
+                pass
+            frame = func(*args, **kwargs)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            # unique per call so that concurrent threads/processes never share a file
+            tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+            try:
+                frame.to_parquet(tmp)
+                os.replace(tmp, path)
+            except Exception as err:  # pylint: disable=W0703
+                logger.warning(
+                    "Failed to cache the DataFrame returned by {}: {}", prefix, err
+                )
+                if tmp.exists():
+                    tmp.unlink()
+            if max_bytes > 0:
+                _evict_cache(cache_dir, max_bytes)
+            if cache_columns is not None:
+                return frame[cache_columns]
+            return frame
+
+        def invalidate(*args, **kwargs) -> None:
+            path = _path(args, kwargs)
+            if path.exists():
+                path.unlink()
+
+        def clear() -> None:
+            for path in cache_dir.glob(f"{prefix}-*.parquet"):
+                path.unlink()
+
+        wrapper.invalidate = invalidate
+        wrapper.clear = clear
+        return wrapper
+
+    return decorator
+
+
+def _escape_partition_value(value: Any) -> str:
+    """Escape a partition value into a (Hive-style) directory name component.
+
+    :param value: A partition value.
+    :return: The escaped value.
+    """
+    if value is None or (
+        isinstance(value, float) and math.isnan(value)
+    ) or value is pd.NaT:
+        return HIVE_DEFAULT_PARTITION
+    return "".join(
+        f"%{ord(char):02X}"
+        if char in "\"#%'*/:=?\\\x7f{[]^" or ord(char) < 32 else char
+        for char in str(value)
+    )
+
+
+def _estimate_row_bytes(
+    frame: pd.DataFrame,
+    compression: str,
+    drop_columns: Sequence[str] = (),
+    sample_rows: int = 10_000
+) -> float:
+    """Estimate the number of bytes per row of a DataFrame written as Parquet
+    by writing a sample of rows into memory.
+
+    :param frame: A pandas DataFrame.
+    :param compression: The compression codec of Parquet.
+    :param drop_columns: Columns (e.g., partition columns) which are not written.
+    :param sample_rows: The number of rows to sample.
+    :return: The estimated number of bytes per row.
+    """
+    if frame.empty:
+        return 1.0
+    # drop columns from the sample only so that the whole frame is never copied
+    sample = frame.sample(min(sample_rows, frame.shape[0]), random_state=0)
+    sample = sample.drop(columns=list(drop_columns))
+    buffer = pa.BufferOutputStream()
+    pq.write_table(
+        pa.Table.from_pandas(sample, preserve_index=False),
+        buffer,
+        compression=compression
+    )
+    return max(buffer.getvalue().size / sample.shape[0], 1.0)
+
+
+def _write_parquet_file(
+    frame: pd.DataFrame, path: Path, row_group_size: int, compression: str
+) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(
+        pa.Table.from_pandas(frame, preserve_index=False),
+        path,
+        row_group_size=row_group_size,
+        compression=compression
+    )
+
+
+def write_partitioned(
+    frame: pd.DataFrame,
+    path: Union[str, Path],
+    partition_cols: Union[str, List[str]] = (),
+    target_file_bytes: int = 128 * 1024**2,
+    row_group_bytes: int = 64 * 1024**2,
+    compression: str = "snappy",
+    workers: int = 0,
+    overwrite: bool = False
+) -> Path:
+    """Write a DataFrame into a directory of Hive-style partitioned Parquet files
+    (e.g., path/year=2021/month=1/part-00000-xxx.snappy.parquet)
+    which can be uploaded by Hdfs.put and read efficiently by Spark.
+    Each partition is split into files of about target_file_bytes bytes
+    (estimated by writing a sample of rows)
+    and files are written concurrently into a hidden temporary directory
+    which is committed atomically (by renaming) after a _SUCCESS marker is written into it.
+    When overwriting, the existing directory is restored if the new one cannot be committed.
+
+    :param frame: A pandas DataFrame.
+    :param path: The output directory.
+    :param partition_cols: Columns to partition the data by.
+    :param target_file_bytes: The target size (in bytes) of each Parquet file.
+    :param row_group_bytes: The target size (in bytes) of row groups in Parquet files.
+    :param compression: The compression codec of Parquet.
+    :param workers: The number of worker threads (0 means the default of ThreadPoolExecutor).
+    :param overwrite: If true, replace the output directory if it already exists.
+    :raises FileExistsError: If the output directory already exists and overwrite is False.
+    :return: The output directory as a Path object.
+    """
+    if isinstance(path, str):
+        path = Path(path)
+    if isinstance(partition_cols, str):
+        partition_cols = [partition_cols]
+    partition_cols = list(partition_cols)
+    if path.exists() and not overwrite:
+        raise FileExistsError(f"The output path {path} already exists!")
+    uid = uuid.uuid4().hex
+    tmp_dir = path.with_name(f".{path.name}.tmp-{uid}")
+    tmp_dir.mkdir(parents=True)
+    try:
+        row_bytes = _estimate_row_bytes(frame, compression, partition_cols)
+        rows_per_file = max(int(target_file_bytes / row_bytes), 1)
+        rows_per_group = min(max(int(row_group_bytes / row_bytes), 1), rows_per_file)
+        logger.info(
+            "Writing Parquet files of about {:,} rows and row groups of about {:,} rows...",
+            rows_per_file, rows_per_group
+        )
+        if partition_cols:
+            groups = frame.groupby(
+                partition_cols, sort=False, dropna=False, observed=True
+            )
+        else:
+            groups = [((), frame)]
+        with ThreadPoolExecutor(
+            max_workers=workers if workers > 0 else None
+        ) as executor:
+            futures = []
+            for key, part in groups:
+                if not isinstance(key, tuple):
+                    key = (key, )
+                subdir = tmp_dir.joinpath(
+                    *(
+                        f"{col}={_escape_partition_value(value)}"
+                        for col, value in zip(partition_cols, key)
+                    )
+                )
+                part = part.drop(columns=partition_cols)
+                for start in range(0, part.shape[0], rows_per_file):
+                    file = subdir / f"part-{len(futures):05d}-{uid}.{compression}.parquet"
+                    futures.append(
+                        executor.submit(
+                            _write_parquet_file,
+                            part.iloc[start:(start + rows_per_file)], file,
+                            rows_per_group, compression
+                        )
+                    )
+            for future in futures:
+                future.result()
+        (tmp_dir / "_SUCCESS").touch()
+        if path.exists():
+            old_dir = path.with_name(f".{path.name}.old-{uid}")
+            path.rename(old_dir)
+            try:
+                tmp_dir.rename(path)
+            except BaseException:
+                # put the old dataset back so that it is never left hidden
+                old_dir.rename(path)
+                raise
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            tmp_dir.rename(path)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    logger.info("{:,} Parquet files are written into {}.", len(futures), path)
+    return path
@@ -6,6 +6,8 @@ import re
 from collections import deque
 from difflib import SequenceMatcher
 import time
+from ..profiling import profile_memory
+
 DASH_50 = "-" * 50
 
 
@@ -141,11 +143,14 @@ class LogFilter:
         """
         if self.num_rows is not None:
             return
+        # imported lazily as dsutil.text depends on pyarrow
+        from ..text import count_lines  # pylint: disable=C0415
         print('Calculating total number of rows ...')
-        self.num_rows = sum(1 for line in open(self._log_file, 'r'))
+        self.num_rows = count_lines(self._log_file)
         print('Total number of rows: ', '{:,}'.format(self.num_rows))
         self.step = max(self.num_rows // 1000, 1000)
 
+    @profile_memory
     def filter(self):
         """Filter informative liens from a Spark application log.
         """
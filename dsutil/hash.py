@@ -4,8 +4,10 @@ import hashlib
 from typing import Union, List, Tuple
 from pathlib import Path
 from loguru import logger
+from .profiling import profile_memory
 
 
+@profile_memory
 def rmd5(path: Union[str, Path], output: Union[str, Path] = "") -> str:
     """Calculate md5sums recursively for the given path.
 
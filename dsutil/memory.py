@@ -1,95 +1,881 @@
 """Memory related utils.
 """
+from typing import Callable, Dict, Iterable, Iterator, Sequence, Tuple, Union
+from pathlib import Path
+from dataclasses import dataclass
+import os
 import getpass
-import sys
 import math
+import mmap
+import threading
+import warnings
 from collections import deque
 import time
 from argparse import ArgumentParser, Namespace
 import numpy as np
+import pandas as pd
 import psutil
 from loguru import logger
+# re-exported for backward compatibility
+from .profiling import (  # pylint: disable=W0611
+    PROFILE_ENV, PROFILE_OUTPUT_ENV, MemoryProfile, profile_memory
+)
+
 USER = getpass.getuser()
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+SMAPS_FIELDS = (
+    "Rss", "Pss", "Private_Clean", "Private_Dirty", "Shared_Clean", "Shared_Dirty"
+)
+PROCESS_COLUMNS = ["pid", "user", "name", "rss", "pss", "uss", "shared"]
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+
+class ProcMemorySampler:
+    """Sample the memory usage of users by reading /proc directly.
+    The owner (uid) of a process is checked before reading its memory usage
+    and the pid-to-uid mapping is cached between samples
+    (keyed by the inode and ctime of /proc/<pid> so that a reused pid is detected).
+    Besides RSS (from /proc/<pid>/statm),
+    PSS (proportional set size, shared pages are divided among processes sharing them)
+    and USS (unique set size, private pages only) are read from /proc/<pid>/smaps_rollup.
+    As reading smaps_rollup is expensive,
+    it is sampled adaptively: a cached reading is scaled by the change of RSS
+    and it is refreshed only if RSS changes by more than refresh_ratio
+    or if the cached reading is older than max_age seconds.
+    For processes whose smaps is not readable (e.g., processes of other users),
+    RSS is used as PSS and USS (which is logged once).
+    """
+    def __init__(
+        self, proc: str = "/proc", refresh_ratio: float = 0.05, max_age: float = 10
+    ):
+        self.proc = proc
+        self.refresh_ratio = refresh_ratio
+        self.max_age = max_age
+        self._uids = {}
+        self._users = {}
+        self._smaps = {}
+        self._smaps_denied = False
+        self._lock = threading.Lock()
+
+    def _uid(self, pid: str) -> int:
+        # a single stat of /proc/<pid> gives both the owner and an identity of the process:
+        # the inode and ctime of the directory change when the pid is reused
+        stat = os.stat(f"{self.proc}/{pid}")
+        key = (stat.st_ino, stat.st_ctime_ns)
+        cache = self._uids.get(pid)
+        if cache is None or cache[0] != key:
+            # the pid is new or it has been reused by another process
+            self._smaps.pop(pid, None)
+            cache = self._uids[pid] = (key, stat.st_uid)
+        return cache[1]
+
+    def _user(self, uid: int) -> str:
+        user = self._users.get(uid)
+        if user is None:
+            import pwd  # pylint: disable=C0415
+            try:
+                user = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                user = str(uid)
+            self._users[uid] = user
+        return user
+
+    def _rss(self, pid: str) -> int:
+        # the 2nd field of statm is the resident set size (VmRSS in status) in pages
+        with open(f"{self.proc}/{pid}/statm", "rb", buffering=0) as fin:
+            return int(fin.read().split(maxsplit=2)[1]) * PAGE_SIZE
+
+    def _read_smaps(self, pid: str) -> Dict[str, int]:
+        """Read RSS, PSS, USS and shared memory (in bytes) of a process from smaps_rollup
+        (or from smaps if smaps_rollup is not supported by the kernel).
+
+        :param pid: The id of a process.
+        :return: A dict with keys rss, pss, uss and shared.
+        """
+        fields = dict.fromkeys(SMAPS_FIELDS, 0)
+        path = f"{self.proc}/{pid}/smaps_rollup"
+        if not os.path.exists(path):
+            path = f"{self.proc}/{pid}/smaps"
+        with open(path, "rb") as fin:
+            for line in fin:
+                key, _, value = line.partition(b":")
+                key = key.decode()
+                if key in fields:
+                    fields[key] += int(value.split()[0]) * 1024
+        return {
+            "rss": fields["Rss"],
+            "pss": fields["Pss"],
+            "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+            "shared": fields["Shared_Clean"] + fields["Shared_Dirty"],
+        }
+
+    def _memory(self, pid: str, metric: str) -> Dict[str, int]:
+        """Get the memory usage of a process.
+
+        :param pid: The id of a process.
+        :param metric: One of rss, pss, uss or all (for all of them).
+        :return: A dict containing the requested metric(s) in bytes.
+        """
+        rss = self._rss(pid)
+        if metric == "rss":
+            return {"rss": rss}
+        now = time.monotonic()
+        cache = self._smaps.get(pid)
+        if cache is None or now - cache[0] > self.max_age or abs(
+            rss - cache[1]["rss"]
+        ) > self.refresh_ratio * cache[1]["rss"]:
+            try:
+                stats = self._read_smaps(pid)
+            except PermissionError:
+                # smaps of processes of other users are not readable
+                if not self._smaps_denied:
+                    self._smaps_denied = True
+                    logger.warning(
+                        "smaps of some processes (e.g., {}) are not readable, "
+                        "RSS is used as PSS/USS for them.", pid
+                    )
+                stats = {"rss": rss, "pss": rss, "uss": rss, "shared": 0}
+            cache = self._smaps[pid] = (now, stats)
+        stats = cache[1]
+        scale = rss / stats["rss"] if stats["rss"] else 1
+        return {key: int(value * scale) for key, value in stats.items()}
+
+    def _uids_of(self, users: Iterable[str]) -> set:
+        import pwd  # pylint: disable=C0415
+        uids = set()
+        for user in users:
+            try:
+                uids.add(pwd.getpwnam(user).pw_uid)
+            except KeyError:
+                pass
+        return uids
+
+    def _iter_pids(self, users: Iterable[str]) -> Iterator[Tuple[str, int]]:
+        """Iterate over (pid, uid) of processes of the specified users.
+
+        :param users: Users whose processes to iterate. If empty, iterate all processes.
+        """
+        users = list(users)
+        uids = self._uids_of(users) if users else None
+        pids = [entry.name for entry in os.scandir(self.proc) if entry.name.isdigit()]
+        alive = set(pids)
+        for cache in (self._uids, self._smaps):
+            for pid in [pid for pid in cache if pid not in alive]:
+                del cache[pid]
+        for pid in pids:
+            try:
+                uid = self._uid(pid)
+            except (FileNotFoundError, ProcessLookupError):
+                continue
+            if uids is None or uid in uids:
+                yield pid, uid
+
+    def sample(self, users: Iterable[str] = (), metric: str = "rss") -> Dict[str, int]:
+        """Sample the memory usage of users.
+
+        :param users: Users whose memory usage to sample. If empty, sample all users.
+        :param metric: The memory metric to use (rss, pss or uss).
+        :return: A dict mapping users to their memory usage in bytes.
+        """
+        _check_metric(metric)
+        users = list(users)
+        with self._lock:
+            totals = dict.fromkeys(self._uids_of(users), 0) if users else {}
+            for pid, uid in self._iter_pids(users):
+                try:
+                    mem = self._memory(pid, metric)[metric]
+                except (FileNotFoundError, ProcessLookupError, PermissionError):
+                    # the process has exited
+                    self._uids.pop(pid, None)
+                    continue
+                totals[uid] = totals.get(uid, 0) + mem
+            return {self._user(uid): total for uid, total in totals.items()}
+
+    def processes(self, users: Iterable[str] = ()) -> pd.DataFrame:
+        """Get the memory usage (rss, pss, uss and shared) of processes.
+
+        :param users: Users whose processes to include. If empty, include all processes.
+        :return: A pandas DataFrame with columns pid, user, name, rss, pss, uss and shared.
+        """
+        rows = []
+        with self._lock:
+            for pid, uid in self._iter_pids(users):
+                try:
+                    mem = self._memory(pid, "all")
+                    with open(f"{self.proc}/{pid}/comm", "rb") as fin:
+                        name = fin.read().decode(errors="replace").strip()
+                except (FileNotFoundError, ProcessLookupError, PermissionError):
+                    self._uids.pop(pid, None)
+                    continue
+                rows.append(
+                    {
+                        "pid": int(pid),
+                        "user": self._user(uid),
+                        "name": name,
+                        **mem
+                    }
+                )
+        return pd.DataFrame(rows, columns=PROCESS_COLUMNS)
+
+
+def _check_metric(metric: str) -> None:
+    """Check whether a memory metric is supported.
+
+    :param metric: A memory metric.
+    :raises ValueError: If the metric is not one of rss, pss or uss.
+    """
+    if metric not in ("rss", "pss", "uss"):
+        raise ValueError(
+            f"The metric must be one of rss, pss or uss but {metric} is given!"
+        )
+
+
+def _psutil_memory(proc: psutil.Process, metric: str) -> Dict[str, int]:
+    if metric == "rss":
+        return {"rss": proc.memory_info().rss}
+    mem = proc.memory_full_info()
+    # pss is not available on macOS and Windows
+    return {
+        "rss": mem.rss,
+        "pss": getattr(mem, "pss", mem.uss),
+        "uss": mem.uss,
+        "shared": getattr(mem, "shared", 0),
+    }
+
+
+def _sample_psutil(users: Iterable[str] = (), metric: str = "rss") -> Dict[str, int]:
+    """Sample the memory usage of users using psutil (when /proc is not available).
+
+    :param users: Users whose memory usage to sample. If empty, sample all users.
+    :param metric: The memory metric to use (rss, pss or uss).
+    :return: A dict mapping users to their memory usage in bytes.
+    """
+    _check_metric(metric)
+    users = set(users)
+    totals = dict.fromkeys(users, 0)
+    for proc in psutil.process_iter(["username"]):
+        user = proc.info["username"]
+        if user is None or (users and user not in users):
+            continue
+        try:
+            mem = _psutil_memory(proc, metric)[metric]
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        totals[user] = totals.get(user, 0) + mem
+    return totals
+
+
+_SAMPLER = ProcMemorySampler() if os.path.isdir("/proc/self") else None
 
 
-def get_memory_usage(user: str = USER) -> int:
+def get_memory_usage_by_user(users: Iterable[str] = (), metric: str = "rss") -> Dict[
+    str, int]:
+    """Get the memory usage of users in one pass.
+
+    :param users: Users whose memory usage to get. If empty, get all users.
+    :param metric: The memory metric to use: rss (resident set size),
+        pss (proportional set size, which does not overcount pages shared among processes)
+        or uss (unique set size, i.e., private memory only).
+    :return: A dict mapping users to their memory usage in bytes.
+    """
+    if _SAMPLER is None:
+        return _sample_psutil(users, metric)
+    return _SAMPLER.sample(users, metric)
+
+
+def get_memory_usage(user: str = USER, metric: str = "rss") -> int:
     """Get the memory usage of the specified user.
 
     :param user: The user whose memory usage to get.
+    :param metric: The memory metric to use (rss, pss or uss).
     :return: The memory usage of the user in bytes.
     """
-    STATUS = (
-        psutil.STATUS_RUNNING,
-        psutil.STATUS_SLEEPING,
-        psutil.STATUS_DISK_SLEEP,
-        psutil.STATUS_WAKING,
-        psutil.STATUS_PARKED,
-        psutil.STATUS_IDLE,
-        psutil.STATUS_WAITING,
+    return get_memory_usage_by_user([user], metric).get(user, 0)
+
+
+def get_process_memory_usage(users: Iterable[str] = ()) -> pd.DataFrame:
+    """Get a breakdown of memory usage (rss, pss, uss and shared) by processes.
+
+    :param users: Users whose processes to include. If empty, include all processes.
+    :return: A pandas DataFrame with columns pid, user, name, rss, pss, uss and shared.
+    """
+    if _SAMPLER is not None:
+        return _SAMPLER.processes(users)
+    users = set(users)
+    rows = []
+    for proc in psutil.process_iter(["pid", "username", "name"]):
+        if proc.info["username"] is None or (
+            users and proc.info["username"] not in users
+        ):
+            continue
+        try:
+            mem = _psutil_memory(proc, "all")
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        rows.append(
+            {
+                "pid": proc.info["pid"],
+                "user": proc.info["username"],
+                "name": proc.info["name"],
+                **mem
+            }
+        )
+    return pd.DataFrame(rows, columns=PROCESS_COLUMNS)
+
+
+class MemoryRecorder:
+    """Record the memory usage of a user into a preallocated ring buffer
+    (NumPy arrays) in a background thread.
+    The CPU time spent on sampling is tracked
+    and the sampling interval is stretched automatically
+    if sampling takes more than max_overhead of the interval.
+    """
+    def __init__(
+        self,
+        interval: float = 1,
+        capacity: int = 86_400,
+        user: str = USER,
+        metric: str = "rss",
+        prometheus_file: Union[str, Path] = "",
+        max_overhead: float = 0.01
+    ):
+        """Initialize a MemoryRecorder object.
+
+        :param interval: The number of seconds between 2 samples.
+        :param capacity: The maximum number of (latest) samples to keep.
+        :param user: The user whose memory usage to record.
+        :param metric: The memory metric to use (rss, pss or uss).
+        :param prometheus_file: If specified, write the latest sample into this file
+            in the Prometheus text format (for the textfile collector of node exporters).
+        :param max_overhead: The maximum fraction of CPU time to spend on sampling.
+        """
+        _check_metric(metric)
+        self.interval = self._interval = interval
+        self.user = user
+        self.metric = metric
+        self.prometheus_file = Path(prometheus_file) if prometheus_file else None
+        self.max_overhead = max_overhead
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._values = np.zeros(capacity, dtype=np.int64)
+        self._count = 0
+        self._cpu_time = 0.0
+        self._started_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __len__(self):
+        return min(self._count, self._values.size)
+
+    def sample(self) -> int:
+        """Take a sample of the memory usage and record it.
+
+        :return: The sampled memory usage in bytes.
+        """
+        value = get_memory_usage(self.user, self.metric)
+        with self._lock:
+            idx = self._count % self._values.size
+            self._timestamps[idx] = time.time()
+            self._values[idx] = value
+            self._count += 1
+        if self.prometheus_file:
+            self._write_prometheus(value)
+        return value
+
+    def _run(self):
+        cost_avg = 0.0
+        while not self._stop.wait(self.interval):
+            begin = time.thread_time()
+            self.sample()
+            cost = time.thread_time() - begin
+            self._cpu_time += cost
+            # keep the (smoothed) CPU time of sampling under max_overhead of the interval
+            cost_avg = 0.8 * cost_avg + 0.2 * cost
+            self.interval = max(self._interval, cost_avg / self.max_overhead)
+
+    def start(self) -> "MemoryRecorder":
+        """Start recording in a background (daemon) thread.
+
+        :return: The MemoryRecorder object itself.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._started_at = time.monotonic()
+        self.sample()
+        self._thread = threading.Thread(
+            target=self._run, name="MemoryRecorder", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop recording.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def overhead(self) -> float:
+        """The fraction of (wall-clock) time spent on sampling (in CPU time).
+        """
+        if self._started_at is None:
+            return 0.0
+        return self._cpu_time / max(time.monotonic() - self._started_at, 1e-9)
+
+    def _ordered(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the recorded (timestamps, values) in chronological order.
+        """
+        with self._lock:
+            if self._count <= self._values.size:
+                return self._timestamps[:self._count].copy(
+                ), self._values[:self._count].copy()
+            idx = self._count % self._values.size
+            return (
+                np.concatenate([self._timestamps[idx:], self._timestamps[:idx]]),
+                np.concatenate([self._values[idx:], self._values[:idx]]),
+            )
+
+    def to_frame(self) -> pd.DataFrame:
+        """Get the recorded samples as a DataFrame.
+
+        :return: A pandas DataFrame with columns time and bytes.
+        """
+        timestamps, values = self._ordered()
+        return pd.DataFrame(
+            {
+                "time": pd.to_datetime(timestamps, unit="s"),
+                "bytes": values
+            }
+        )
+
+    def summary(self, percentiles: Sequence[float] = (50, 90, 99)) -> Dict[str, float]:
+        """Summarize the recorded samples.
+
+        :param percentiles: Percentiles (between 0 and 100) of memory usage to report.
+        :return: A dict containing the number of samples, the latest, peak and mean memory usage,
+            percentiles of memory usage and the trend (slope of the least squares line in bytes per second).
+        """
+        timestamps, values = self._ordered()
+        if values.size == 0:
+            return {"samples": 0}
+        summary = {
+            "samples": int(values.size),
+            "latest": int(values[-1]),
+            "peak": int(values.max()),
+            "peak_time": float(timestamps[values.argmax()]),
+            "mean": float(values.mean()),
+        }
+        for p, value in zip(percentiles, np.percentile(values, percentiles)):
+            summary[f"p{p:g}"] = float(value)
+        summary["trend"] = float(
+            np.polyfit(timestamps - timestamps[0], values, 1)[0]
+        ) if values.size > 1 else 0.0
+        return summary
+
+    def dump(self, path: Union[str, Path]) -> None:
+        """Dump the recorded samples into a CSV or Parquet file (based on the file extension).
+
+        :param path: The path of the output file.
+        """
+        if isinstance(path, str):
+            path = Path(path)
+        frame = self.to_frame()
+        if path.suffix.lower() == ".parquet":
+            frame.to_parquet(path)
+        else:
+            frame.to_csv(path, index=False)
+
+    def _write_prometheus(self, value: int) -> None:
+        labels = f'user="{self.user}",metric="{self.metric}"'
+        text = (
+            "# HELP dsutil_memory_usage_bytes Memory usage of the user.\n"
+            "# TYPE dsutil_memory_usage_bytes gauge\n"
+            f"dsutil_memory_usage_bytes{{{labels}}} {value}\n"
+        )
+        # write atomically so that node exporters never read a partial file
+        tmp = self.prometheus_file.with_name(self.prometheus_file.name + ".tmp")
+        tmp.write_text(text)
+        os.replace(tmp, self.prometheus_file)
+
+
+def monitor_memory_usage(
+    seconds: float = 1,
+    user: str = USER,
+    metric: str = "rss",
+    output: Union[str, Path] = "",
+    prometheus_file: Union[str, Path] = ""
+):
+    """Record and log out the memory usage of the specified user in a specified frequency
+    until interrupted (by Ctrl+C).
+
+    :param seconds: The number of seconds between 2 samples.
+    :param user: The user whose memory usage to monitor.
+    :param metric: The memory metric to use (rss, pss or uss).
+    :param output: If specified, dump the recorded samples into this (CSV or Parquet) file at exit.
+    :param prometheus_file: If specified, write the latest sample into this file
+        in the Prometheus text format.
+    """
+    recorder = MemoryRecorder(
+        interval=seconds, user=user, metric=metric, prometheus_file=prometheus_file
     )
+    recorder.start()
+    try:
+        while True:
+            time.sleep(recorder.interval)
+            summary = recorder.summary()
+            logger.info(
+                "Memory used by {}: {:,} (peak: {:,})", user, summary["latest"],
+                summary["peak"]
+            )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.stop()
+        logger.info("Summary of memory used by {}: {}", user, recorder.summary())
+        if output:
+            recorder.dump(output)
+
+
+def _cgroup_memory_dir() -> Tuple[Union[Path, None], int]:
+    """Find the memory cgroup directory of the current process.
+
+    :return: A tuple of the cgroup directory (None if not found)
+        and the version (2 or 1, 0 if not found) of cgroup.
+    """
     try:
-        return sum(
-            p.memory_info().rss for p in psutil.process_iter()
-            if p.username() == USER and p.status() in STATUS
+        lines = Path("/proc/self/cgroup").read_text().splitlines()
+    except OSError:
+        return None, 0
+    for line in lines:
+        _, controllers, path = line.split(":", 2)
+        path = path.lstrip("/")
+        if not controllers:
+            for dir_ in (CGROUP_ROOT / path, CGROUP_ROOT):
+                if (dir_ / "memory.max").is_file():
+                    return dir_, 2
+        elif "memory" in controllers.split(","):
+            for dir_ in (CGROUP_ROOT / "memory" / path, CGROUP_ROOT / "memory"):
+                if (dir_ / "memory.limit_in_bytes").is_file():
+                    return dir_, 1
+    return None, 0
+
+
+def _memory_limit(dir_: Union[Path, None], version: int, total: int) -> int:
+    """Get the memory limit of a cgroup.
+
+    :param dir_: The memory cgroup directory (None if there is no cgroup).
+    :param version: The version (2 or 1, 0 if there is no cgroup) of cgroup.
+    :param total: The total memory of the host in bytes.
+    :return: The memory limit in bytes.
+    """
+    if dir_ is None:
+        return total
+    text = (dir_ / ("memory.max" if version == 2 else "memory.limit_in_bytes")
+           ).read_text().strip()
+    if text == "max":
+        return total
+    # cgroup v1 uses a huge number for unlimited
+    return min(int(text), total)
+
+
+def get_memory_limit() -> int:
+    """Get the memory limit of the current cgroup (v2 or v1)
+    or the total memory of the host if there is no cgroup memory limit.
+
+    :return: The memory limit in bytes.
+    """
+    return _memory_limit(*_cgroup_memory_dir(), psutil.virtual_memory().total)
+
+
+def _read_pressure(path: Path) -> Dict[str, float]:
+    """Read the avg10 values of a PSI (pressure stall information) file.
+
+    :param path: The path of a PSI file (e.g., memory.pressure of cgroup v2 or /proc/pressure/memory).
+    :return: A dict with keys pressure_some and pressure_full (None if not available).
+    """
+    pressure = {"pressure_some": None, "pressure_full": None}
+    try:
+        lines = path.read_text().splitlines()
+    except OSError:
+        return pressure
+    for line in lines:
+        kind, *fields = line.split()
+        for field in fields:
+            key, _, value = field.partition("=")
+            if key == "avg10":
+                pressure[f"pressure_{kind}"] = float(value)
+    return pressure
+
+
+def _memory_stats(dir_: Union[Path, None],
+                  version: int) -> Dict[str, Union[int, float, str, None]]:
+    """Get the memory usage, limit and pressure of a cgroup (or the host).
+
+    :param dir_: The memory cgroup directory (None if there is no cgroup).
+    :param version: The version (2 or 1, 0 if there is no cgroup) of cgroup.
+    :return: See get_memory_stats.
+    """
+    mem = psutil.virtual_memory()
+    if version == 2:
+        current = int((dir_ / "memory.current").read_text())
+        pressure = _read_pressure(dir_ / "memory.pressure")
+    elif version == 1:
+        current = int((dir_ / "memory.usage_in_bytes").read_text())
+        pressure = _read_pressure(Path("/proc/pressure/memory"))
+    else:
+        current = mem.total - mem.available
+        pressure = _read_pressure(Path("/proc/pressure/memory"))
+    limit = _memory_limit(dir_, version, mem.total)
+    return {
+        "source": f"cgroup{version}" if version else "host",
+        "current": current,
+        "limit": limit,
+        "ratio": current / limit,
+        **pressure
+    }
+
+
+def get_memory_stats() -> Dict[str, Union[int, float, str, None]]:
+    """Get the memory usage, limit and pressure of the current cgroup
+    (memory.current, memory.max and memory.pressure of cgroup v2
+    or memory.usage_in_bytes and memory.limit_in_bytes of cgroup v1).
+    Host-level metrics (from psutil and /proc/pressure/memory) are used if there is no cgroup.
+
+    :return: A dict with keys source (cgroup2, cgroup1 or host), current, limit, ratio (current / limit),
+        pressure_some and pressure_full (avg10 percentages of PSI, None if not available).
+    """
+    return _memory_stats(*_cgroup_memory_dir())
+
+
+@dataclass
+class _Watch:
+    callback: Callable[[Dict], None]
+    usage: Union[float, None]
+    pressure: Union[float, None]
+    armed: bool = True
+
+    def level(self, stats: Dict) -> float:
+        """The max ratio of the current metrics to their thresholds.
+        """
+        levels = [0.0]
+        if self.usage is not None:
+            levels.append(stats["ratio"] / self.usage if self.usage > 0 else math.inf)
+        if self.pressure is not None and stats["pressure_some"] is not None:
+            levels.append(
+                stats["pressure_some"] /
+                self.pressure if self.pressure > 0 else math.inf
+            )
+        return max(levels)
+
+
+class MemoryWatchdog:
+    """A watchdog checking the memory usage and pressure of the current cgroup
+    (or the host if there is no cgroup) in a lightweight background thread
+    and firing registered callbacks (e.g., flushing a cache, spilling to disk or shrinking a pool)
+    when thresholds are crossed.
+    A callback fires once when its threshold is crossed
+    and is re-armed after the metrics drop below (1 - hysteresis) times the threshold.
+    The cgroup of the current process is resolved once when the watchdog is created.
+    """
+    def __init__(self, interval: float = 1, hysteresis: float = 0.05):
+        """Initialize a MemoryWatchdog object.
+
+        :param interval: The number of seconds between 2 checks.
+        :param hysteresis: The relative margin below thresholds for re-arming callbacks.
+        """
+        self.interval = interval
+        self.hysteresis = hysteresis
+        self._watches = []
+        self._cgroup = _cgroup_memory_dir()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def register(
+        self,
+        callback: Callable[[Dict], None],
+        usage: Union[float, None] = None,
+        pressure: Union[float, None] = None
+    ) -> None:
+        """Register a callback.
+
+        :param callback: A function taking the dict returned by get_memory_stats.
+        :param usage: Fire the callback when the ratio of memory usage to the limit reaches this value.
+        :param pressure: Fire the callback when the memory pressure (the some avg10 percentage of PSI)
+            reaches this value.
+        :raises ValueError: If neither usage nor pressure is specified.
+        """
+        if usage is None and pressure is None:
+            raise ValueError("At least one of usage and pressure must be specified!")
+        self._watches.append(_Watch(callback, usage, pressure))
+
+    def check(self) -> Dict:
+        """Check memory stats once and fire callbacks whose thresholds are crossed.
+
+        :return: The dict returned by get_memory_stats.
+        """
+        stats = _memory_stats(*self._cgroup)
+        for watch in self._watches:
+            level = watch.level(stats)
+            if level >= 1 and watch.armed:
+                watch.armed = False
+                logger.warning("Memory threshold crossed: {}", stats)
+                try:
+                    watch.callback(stats)
+                except Exception:  # pylint: disable=W0703
+                    logger.exception(
+                        "The memory watchdog callback {} failed.", watch.callback
+                    )
+            elif level < 1 - self.hysteresis:
+                watch.armed = True
+        return stats
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:  # pylint: disable=W0703
+                # keep polling, e.g., if the cgroup is (temporarily) not readable
+                logger.exception("The memory watchdog failed to check memory stats.")
+
+    def start(self) -> "MemoryWatchdog":
+        """Start watching in a background (daemon) thread.
+
+        :return: The MemoryWatchdog object itself.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="MemoryWatchdog", daemon=True
         )
-    except:
-        return get_memory_usage(user)
+        self._thread.start()
+        return self
 
+    def stop(self) -> None:
+        """Stop watching.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
 
-def monitor_memory_usage(seconds: float = 1, user: str = USER):
-    """Log out the memory usage of the specified user in a specified frequency.
 
-    :param seconds: The number of seconds to wait before the next logging.
-    :param user: The user whose memory usage to monitor.
+def _allocate(size: int) -> mmap.mmap:
+    """Allocate an anonymous memory map with all pages touched (so that they are resident).
+
+    :param size: The number of bytes to allocate.
+    :return: The allocated anonymous memory map.
     """
-    while True:
-        time.sleep(seconds)
-        logger.info("Memory used by {}: {:,}", user, get_memory_usage(user=user))
+    block = mmap.mmap(-1, size)
+    np.frombuffer(block, dtype=np.uint8)[::PAGE_SIZE] = 1
+    return block
 
 
 def match_memory_usage(
     target: float,
-    arr_size: int = 1_000_000,
-    sleep_min: float = 1,
-    sleep_max: float = 30
+    user: str = USER,
+    metric: str = "rss",
+    interval: float = 0.2,
+    gain: float = 0.9,
+    tolerance: float = 0.01,
+    max_block: int = 1024**3,
+    duration: float = 0,
+    arr_size: Union[int, None] = None,
+    sleep_min: Union[float, None] = None,
+    sleep_max: Union[float, None] = None
 ):
     """Match a user's memory usage to the specified value.
-    The memory usage will gradually increase to the specified value 
-    if it is smaller than the specified value.
-    Otherwise, 
-    the memory usage drops immediately to match the specified value.
+    Memory is consumed by page-touched anonymous memory maps of exact sizes
+    and a proportional feedback controller allocates (or releases) gain times the gap
+    between the target and the current memory usage in each iteration,
+    so that the target is reached within seconds without overshooting.
 
     :param target: The target memory in bytes.
-    :param arr_size: The size of integer arrays for consuming memory.
-    :param sleep_min: The minimum time of sleeping.
-    :param sleep_max: The maximum time of sleeping.
+    :param user: The user whose memory usage to match.
+    :param metric: The memory metric to use (rss, pss or uss).
+        Use pss or uss to avoid overcounting pages shared among processes.
+    :param interval: The number of seconds to wait between 2 iterations.
+    :param gain: The fraction of the gap to close in each iteration.
+    :param tolerance: The relative tolerance (to the target) of the gap.
+    :param max_block: The maximum number of bytes to allocate in each iteration.
+    :param duration: The number of seconds to keep matching the memory usage.
+        Non-positive values mean forever.
+    :param arr_size: Deprecated, use max_block instead
+        (an array of arr_size integers takes about 8 * arr_size bytes).
+    :param sleep_min: Deprecated, use interval instead.
+    :param sleep_max: Deprecated and ignored (there is no back-off any more).
     """
+    if arr_size is not None:
+        warnings.warn(
+            "arr_size is deprecated, use max_block instead.",
+            DeprecationWarning,
+            stacklevel=2
+        )
+        max_block = arr_size * 8
+    if sleep_min is not None:
+        warnings.warn(
+            "sleep_min is deprecated, use interval instead.",
+            DeprecationWarning,
+            stacklevel=2
+        )
+        interval = sleep_min
+    if sleep_max is not None:
+        warnings.warn(
+            "sleep_max is deprecated and ignored.", DeprecationWarning, stacklevel=2
+        )
     logger.info("Target memory: {:,.0f}", target)
-    # define an template array
-    arr = list(range(arr_size))
-    size = sys.getsizeof(arr)
-    # deque for consuming memory flexibly
-    dq = deque()
-    # define 2 points for linear interpolation of sleep seconds
-    xp = (0, 10)
-    yp = (sleep_max, sleep_min)
-    while True:
-        mem = get_memory_usage(USER)
-        logger.info(
+    blocks = deque()
+    consumed = 0
+    tol = max(tolerance * target, PAGE_SIZE)
+    deadline = time.monotonic() + duration if duration > 0 else math.inf
+    while time.monotonic() < deadline:
+        mem = get_memory_usage(user, metric)
+        logger.debug(
             "Current used memory by {}: {:,} out of which {:,} is contributed by the memory matcher",
-            USER, mem, size * len(dq)
+            user, mem, consumed
         )
-        diff = (target - mem) / size
-        if diff > 0:
-            logger.info("Consuming more memory ...")
-            dq.append(arr.copy())
-            time.sleep(np.interp(diff, xp, yp))
-        else:
-            count = min(math.ceil(-diff), len(dq))
-            logger.info("Releasing memory ...")
-            for _ in range(count):
-                dq.pop()
-            time.sleep(np.interp(count, xp, yp))
+        gap = target - mem
+        if gap > tol:
+            size = max(
+                min(int(gap * gain), max_block) // PAGE_SIZE * PAGE_SIZE, PAGE_SIZE
+            )
+            blocks.append(_allocate(size))
+            consumed += size
+        elif gap < -tol:
+            release = min(int(-gap * gain), consumed)
+            while release >= PAGE_SIZE and blocks:
+                block = blocks.pop()
+                size = len(block)
+                block.close()
+                consumed -= size
+                if size > release:
+                    # shrink the block to release exactly the required amount of memory
+                    size = (size - release) // PAGE_SIZE * PAGE_SIZE
+                    if size:
+                        blocks.append(_allocate(size))
+                        consumed += size
+                    break
+                release -= size
+        time.sleep(interval)
+    for block in blocks:
+        block.close()
 
 
 def parse_args(args=None, namespace=None) -> Namespace:
@@ -103,19 +889,33 @@ def parse_args(args=None, namespace=None) -> Namespace:
     parser = ArgumentParser(
         description="Make memory consumption match the specified target."
     )
-    mutex = parser.add_mutually_exclusive_group()
+    mutex = parser.add_mutually_exclusive_group(required=True)
     mutex.add_argument(
         "-g",
         dest="target",
-        type=lambda s: int(s) * 1073741824,
+        type=lambda s: float(s) * 1073741824,
         help="Specify target memory in gigabytes."
     )
     mutex.add_argument(
         "-m",
         dest="target",
-        type=lambda s: int(s) * 1048576,
+        type=lambda s: float(s) * 1048576,
         help="Specify target memory in megabytes."
     )
+    mutex.add_argument(
+        "-p",
+        dest="target",
+        type=lambda s: float(s) / 100 * get_memory_limit(),
+        help="Specify target memory as a percentage of the cgroup memory limit"
+        " (or the total memory of the host if there is no cgroup memory limit)."
+    )
+    parser.add_argument(
+        "--metric",
+        dest="metric",
+        choices=("rss", "pss", "uss"),
+        default="rss",
+        help="The memory metric to use."
+    )
     return parser.parse_args(args=args, namespace=namespace)
 
 
@@ -123,7 +923,7 @@ def main():
     """The main function for scripting usage.
     """
     args = parse_args()
-    match_memory_usage(args.target)
+    match_memory_usage(args.target, metric=args.metric)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+"""Lightweight memory profiling (via tracemalloc) of blocks of code and functions.
+This module does not depend on numpy/pandas so that it is cheap to import.
+"""
+from typing import Callable, Union
+from pathlib import Path
+import os
+import json
+import time
+import functools
+import threading
+import tracemalloc
+import psutil
+from loguru import logger
+
+PROFILE_ENV = "DSUTIL_PROFILE_MEMORY"
+PROFILE_OUTPUT_ENV = "DSUTIL_PROFILE_MEMORY_OUTPUT"
+TRACEMALLOC_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+)
+# active (enabled) profiles, the innermost last
+_ACTIVE = []
+_ACTIVE_LOCK = threading.Lock()
+
+
+class MemoryProfile:
+    """A context manager recording the peak traced memory (via tracemalloc),
+    the top allocation sites and RSS deltas of a block of code.
+    Profiling is enabled only if the environment variable DSUTIL_PROFILE_MEMORY
+    is set (to a value other than 0/false) unless explicitly enabled,
+    so that it costs nothing when disabled.
+    A structured report (a dict) is logged, kept in the attribute report
+    and appended as a JSON line into the file specified by output
+    (or by the environment variable DSUTIL_PROFILE_MEMORY_OUTPUT)
+    for comparing different versions.
+    Profiles can be nested: with Python >= 3.9 the (process-wide) peak of tracemalloc
+    is reset when an inner profile starts, and the peak before the reset
+    is kept by enclosing profiles so that they still report their own peaks.
+    With Python < 3.9 the peak cannot be reset
+    and the peak of inner blocks is the peak since tracing started.
+    """
+    def __init__(
+        self,
+        label: str = "",
+        top: int = 10,
+        output: Union[str, Path] = "",
+        enabled: Union[bool, None] = None
+    ):
+        """Initialize a MemoryProfile object.
+
+        :param label: A label identifying the profiled block of code.
+        :param top: The number of top allocation sites to report.
+        :param output: A (JSON lines) file to append the report to.
+        :param enabled: Whether to enable profiling.
+            If None, it is decided by the environment variable DSUTIL_PROFILE_MEMORY.
+        """
+        self.label = label
+        self.top = top
+        self.output = output or os.environ.get(PROFILE_OUTPUT_ENV, "")
+        self.enabled = _profiling_enabled() if enabled is None else enabled
+        self.report = None
+        self._stop_tracing = False
+        self._snapshot = None
+        self._traced = 0
+        self._peak = 0
+        self._rss = 0
+        self._time = 0.0
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        self._peak = 0
+        with _ACTIVE_LOCK:
+            self._stop_tracing = not tracemalloc.is_tracing()
+            if self._stop_tracing:
+                tracemalloc.start()
+            elif hasattr(tracemalloc, "reset_peak"):
+                # keep the peak so far for enclosing profiles before resetting it
+                peak = tracemalloc.get_traced_memory()[1]
+                for profile in _ACTIVE:
+                    profile._peak = max(profile._peak, peak)
+                tracemalloc.reset_peak()
+            _ACTIVE.append(self)
+        self._snapshot = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+        self._traced = tracemalloc.get_traced_memory()[0]
+        self._rss = psutil.Process().memory_info().rss
+        self._time = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        if not self.enabled:
+            return
+        duration = time.perf_counter() - self._time
+        with _ACTIVE_LOCK:
+            traced, traced_peak = tracemalloc.get_traced_memory()
+            traced_peak = max(traced_peak, self._peak)
+            _ACTIVE.remove(self)
+        snapshot = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+        if self._stop_tracing:
+            tracemalloc.stop()
+        rss = psutil.Process().memory_info().rss
+        from . import __version__  # pylint: disable=C0415
+        self.report = {
+            "label":
+                self.label,
+            "version":
+                __version__,
+            "timestamp":
+                time.time(),
+            "duration":
+                duration,
+            "traced_peak":
+                traced_peak - self._traced,
+            "traced_delta":
+                traced - self._traced,
+            "rss_before":
+                self._rss,
+            "rss_after":
+                rss,
+            "rss_delta":
+                rss - self._rss,
+            "top":
+                [
+                    {
+                        "file": stat.traceback[0].filename,
+                        "line": stat.traceback[0].lineno,
+                        "size_diff": stat.size_diff,
+                        "count_diff": stat.count_diff,
+                    }
+                    for stat in snapshot.compare_to(self._snapshot, "lineno")[:self.top]
+                ],
+        }
+        self._snapshot = None
+        logger.info(
+            "Memory profile of {}: peak traced {:,} bytes, RSS delta {:,} bytes, {:.3f}s",
+            self.label, self.report["traced_peak"], self.report["rss_delta"], duration
+        )
+        if self.output:
+            with open(self.output, "a") as fout:
+                fout.write(json.dumps(self.report) + "\n")
+
+
+def _profiling_enabled() -> bool:
+    return os.environ.get(PROFILE_ENV, "").lower() not in ("", "0", "false")
+
+
+def profile_memory(func: Union[Callable, None] = None, label: str = "", top: int = 10):
+    """A decorator profiling the memory usage of a function using MemoryProfile.
+    It can be used both as @profile_memory and as @profile_memory(label=..., top=...).
+    The environment variable DSUTIL_PROFILE_MEMORY is checked on each call
+    and the function is called directly if profiling is disabled.
+
+    :param func: The function to profile.
+    :param label: A label identifying the function.
+        If empty, the qualified name of the function is used.
+    :param top: The number of top allocation sites to report.
+    :return: The decorated function (or a decorator if func is None).
+    """
+    if func is None:
+        return functools.partial(profile_memory, label=label, top=top)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _profiling_enabled():
+            return func(*args, **kwargs)
+        with MemoryProfile(
+            label=label or f"{func.__module__}.{func.__qualname__}", top=top
+        ):
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -4,6 +4,7 @@ from typing import List, Union
 import re
 import subprocess as sp
 import pandas as pd
+from .dataframe import optimize_dtypes
 
 
 def to_frame(
@@ -12,7 +13,8 @@ def to_frame(
     header: Union[int, List[str], None] = None,
     skip: Union[int, List[int]] = (),
     lines: List[str] = (),
-    split_by_header: bool = False
+    split_by_header: bool = False,
+    optimize: bool = False
 ) -> pd.DataFrame:
     """Convert the result of a shell command to a DataFrame.
     The headers are splitted by a regular expression
@@ -30,6 +32,9 @@ def to_frame(
     :param split_by_header: If true, the headers are splitted by a regular expression 
         and the columns are splitted by the right-most position of the headers.
         Otherwise, all lines are splitted by the specified regular expression.
+    :param optimize: If true, parse numeric/datetime columns and optimize dtypes
+        of the DataFrame (see dsutil.dataframe.optimize_dtypes).
+        Otherwise, all columns are strings.
     :return: A pandas DataFrame.
     """
     if not lines:
@@ -38,8 +43,12 @@ def to_frame(
         skip = [skip]
     lines = [line for idx, line in enumerate(lines) if idx not in skip]
     if split_by_header:
-        return _to_frame_title(split=split, lines=lines)
-    return _to_frame_space(split=split, header=header, lines=lines)
+        frame = _to_frame_title(split=split, lines=lines)
+    else:
+        frame = _to_frame_space(split=split, header=header, lines=lines)
+    if optimize:
+        frame = optimize_dtypes(frame)
+    return frame
 
 
 def _to_frame_space(
@@ -2,10 +2,279 @@
 """
 #!/usr/bin/env python3
 # encoding: utf-8
-from typing import Union, List
+from typing import Any, Callable, Union, List, Dict, Sequence, Tuple, Iterator, BinaryIO, TextIO, ContextManager
+import os
+import io
+import re
 import sys
+import gzip
+import bz2
+import lzma
+import mmap
+import csv
+import operator
+import fnmatch
+import itertools
+import heapq
+import tempfile
+import zlib
+import math
+import glob
+import random
+import threading
+import json
 from pathlib import Path
+from collections import deque
+from contextlib import nullcontext, ExitStack
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from loguru import logger
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import csv as pacsv
+
+BUFFER_SIZE = 16 * 1024**2
+# a quoted record spanning more bytes than this is taken as an unbalanced quote
+MAX_RECORD_SIZE = 64 * 1024**2
+PARALLEL_CHUNK_SIZE = 256 * 1024**2
+MAGIC_BYTES = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+    (b"\xfd7zXZ\x00", "xz"),
+)
+SUFFIX_COMPRESSION = {".gz": "gzip", ".bz2": "bz2", ".zst": "zstd", ".xz": "xz"}
+COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+NUMBER_PATTERN = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+NUMBER_REGEX = re.compile(NUMBER_PATTERN)
+OPERATORS = tuple(COMPARISONS) + ("in", "not in", "regex", "between")
+GZIP_BLOCK_SIZE = 4 * 1024**2
+MERGE_BUFFER_SIZE = 1024**2
+LINE_INDEX_CHECKSUM_SIZE = 4096
+MAX_MERGE_FILES = 128
+CSV_CONVERSION_ERROR = re.compile(r"column #(\d+).*invalid value '(.*)'", re.DOTALL)
+# blocks of JSON are smaller as each of them is expanded into a list of tokens
+JSON_BLOCK_SIZE = 1024**2
+JSON_TOKEN = re.compile(
+    r'(\s*)(?:("[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]:,]|[^\s{}\[\]:,"]+)|(\S))'
+)
+
+
+def _natural_key(path: Union[str, Path]) -> list:
+    """Get the key for sorting paths naturally (e.g., part-2 before part-10).
+
+    :param path: A path.
+    :return: A list of alternating strings and integers.
+    """
+    return [
+        int(part) if part.isdigit() else part
+        for part in re.split(r"(\d+)",
+                             Path(path).name)
+    ]
+
+
+def _list_files(dir_: Path) -> List[Path]:
+    """List data files (e.g., part-00000, part-00001, etc.) in a directory in natural order.
+    Hidden files and files starting with an underscore (e.g., _SUCCESS) are ignored.
+
+    :param dir_: A directory.
+    :return: A list of files sorted naturally.
+    """
+    return sorted(
+        (
+            path for path in dir_.iterdir()
+            if path.is_file() and not path.name.startswith(("_", "."))
+        ),
+        key=_natural_key
+    )
+
+
+def _detect_compression(path: Union[str, Path]) -> str:
+    """Detect the compression format of a file by its magic bytes.
+
+    :param path: The path of a file.
+    :return: One of gzip, bz2, zstd, xz or an empty string (if not compressed).
+    """
+    with open(path, "rb") as fin:
+        head = fin.read(6)
+    for magic, compression in MAGIC_BYTES:
+        if head.startswith(magic):
+            return compression
+    return ""
+
+
+def _import_zstandard():
+    try:
+        import zstandard  # pylint: disable=C0415
+    except ImportError as err:
+        raise ImportError(
+            "The package zstandard is required for zstd compressed files."
+            " Please install it via: pip3 install dsutil[zstd]"
+        ) from err
+    return zstandard
+
+
+def _open_input(path: Union[str, Path]) -> BinaryIO:
+    """Open a (possibly gzip/bz2/zstd/xz compressed) file for reading in binary mode.
+    The compression format is detected by magic bytes
+    and the file is decompressed transparently as a stream.
+
+    :param path: The path of a file.
+    :return: A file object for reading (decompressed) bytes.
+    """
+    compression = _detect_compression(path)
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "bz2":
+        return bz2.open(path, "rb")
+    if compression == "xz":
+        return lzma.open(path, "rb")
+    if compression == "zstd":
+        reader = _import_zstandard().ZstdDecompressor().stream_reader(
+            open(path, "rb"), read_across_frames=True, closefd=True
+        )
+        return io.BufferedReader(reader, BUFFER_SIZE)
+    return open(path, "rb")
+
+
+def _gzip_compress(data: bytes, compresslevel: int) -> bytes:
+    """Compress data into a (complete) gzip member.
+    zlib releases the GIL while compressing so that blocks can be compressed by threads in parallel.
+
+    :param data: The data to compress.
+    :param compresslevel: The compression level.
+    :return: A gzip member.
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+class ParallelGzipWriter(io.BufferedIOBase):
+    """A gzip writer which compresses blocks in parallel (like pigz).
+    Data is split into blocks which are compressed into gzip members by a thread pool
+    and the members are written in order,
+    which makes a standard multi-member gzip file (readable by gzip, gunzip, Spark, etc.).
+    The number of blocks being compressed is bounded so that memory stays bounded.
+    """
+    def __init__(
+        self,
+        path: Union[str, Path],
+        compresslevel: int = 6,
+        threads: int = -1,
+        block_size: int = GZIP_BLOCK_SIZE
+    ):
+        """Initialize a ParallelGzipWriter.
+
+        :param path: The path of the gzip file.
+        :param compresslevel: The compression level (0-9).
+        :param threads: The number of compressing threads
+            (a non-positive value means the number of CPUs).
+        :param block_size: The size (in bytes) of blocks which are compressed independently.
+        """
+        super().__init__()
+        threads = threads if threads > 0 else os.cpu_count() or 1
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+        self._file = open(path, "wb")
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._max_pending = 2 * threads
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._members = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(
+            self._executor.submit(_gzip_compress, block, self.compresslevel)
+        )
+        self._members += 1
+        while self._pending and (
+            len(self._pending) >= self._max_pending or self._pending[0].done()
+        ):
+            self._file.write(self._pending.popleft().result())
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        size = memoryview(data).nbytes
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return size
+
+    def flush(self) -> None:
+        """Compress buffered data (as a gzip member) and write all compressed members.
+        """
+        if self.closed:
+            return
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._file.write(self._pending.popleft().result())
+        self._file.flush()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            # an empty gzip file still needs a (empty) member
+            if not self._buffer and not self._members:
+                self._submit(b"")
+            # flushes remaining data
+            super().close()
+        finally:
+            self._executor.shutdown()
+            self._file.close()
+
+
+def _open_output(
+    output: Union[str, Path],
+    compresslevel: Union[int, None] = None,
+    threads: int = 0
+) -> ContextManager[BinaryIO]:
+    """Open a file for writing in binary mode.
+    The output is compressed (gzip, bz2, zstd or xz) based on the file extension
+    (.gz, .bz2, .zst or .xz).
+
+    :param output: The path of the output file. If empty, the standard output is used.
+    :param compresslevel: The compression level (the default of the compression format if None).
+    :param threads: The number of threads for compression (where supported, i.e., gzip and zstd).
+        0 means single-threaded and a negative value means using all cores.
+        A multi-threaded gzip output is written by ParallelGzipWriter.
+    :return: A context manager of a file object for writing.
+    """
+    if not output:
+        return nullcontext(sys.stdout.buffer)
+    compression = SUFFIX_COMPRESSION.get(Path(output).suffix.lower(), "")
+    if compression == "gzip":
+        compresslevel = 6 if compresslevel is None else compresslevel
+        if threads:
+            return ParallelGzipWriter(output, compresslevel, threads)
+        return gzip.open(output, "wb", compresslevel=compresslevel)
+    if compression == "bz2":
+        return bz2.open(
+            output, "wb", compresslevel=9 if compresslevel is None else compresslevel
+        )
+    if compression == "xz":
+        return lzma.open(output, "wb", preset=compresslevel)
+    if compression == "zstd":
+        compressor = _import_zstandard().ZstdCompressor(
+            level=3 if compresslevel is None else compresslevel, threads=threads
+        )
+        return compressor.stream_writer(open(output, "wb"), closefd=True)
+    return open(output, "wb")
 
 
 def has_header(
@@ -14,23 +283,31 @@ def has_header(
 ) -> bool:
     """Check whether the files have headers.
 
-    :param files: the list of files to check.
+    :param files: the list of files to check
+        or the path to a directory containing files to check.
     :param num_files_checking: the number of non-empty files to use to decide whether there are header lines.
     :return: True if the files have headers and False otherwise.
     """
+    if isinstance(files, str):
+        files = Path(files)
+    if isinstance(files, Path):
+        files = _list_files(files) if files.is_dir() else [files]
+    possible_header = None
     # i: file index
     for i in range(len(files)):
-        with open(files[i], "r", encoding="utf-8") as fin:
+        with _open_input(files[i]) as fin:
             first_line = fin.readline()
             if first_line:
                 possible_header = first_line
                 break
+    if possible_header is None:
+        return False
     # k: current number of non-empty files
     k = 1
-    for j in range(i, len(files)):
+    for j in range(i + 1, len(files)):
         if k >= num_files_checking:
             break
-        with open(files[j], "r", encoding="utf-8") as fin:
+        with _open_input(files[j]) as fin:
             first_line = fin.readline()
             if first_line:
                 k += 1
@@ -39,128 +316,989 @@ def has_header(
     return True
 
 
+def _copy_file(fin: BinaryIO, fout: BinaryIO) -> bytes:
+    """Copy the rest (from the current position) of a file to another file in bulk.
+    The copy is done in kernel (zero-copy) using os.copy_file_range or os.sendfile
+    if both files are regular (uncompressed) files
+    and falls back to copying with large buffers otherwise.
+
+    :param fin: A file object opened in binary mode for reading.
+    :param fout: A file object opened in binary mode for writing.
+    :return: The last byte copied (empty if nothing is copied).
+    """
+    offset = fin.tell()
+    if isinstance(getattr(fin, "raw", fin),
+                  io.FileIO) and isinstance(getattr(fout, "raw", fout), io.FileIO):
+        fout.flush()
+        infd = fin.fileno()
+        outfd = fout.fileno()
+        start = offset
+        end = os.fstat(infd).st_size
+        offset = _copy_fd(infd, outfd, offset, end)
+        if offset == end:
+            return os.pread(infd, 1, end - 1) if end > start else b""
+        fin.seek(offset)
+    last = b""
+    while True:
+        chunk = fin.read(BUFFER_SIZE)
+        if not chunk:
+            return last
+        fout.write(chunk)
+        last = chunk[-1:]
+
+
+def _copy_fd(infd: int, outfd: int, offset: int, end: int) -> int:
+    """Copy bytes in the range [offset, end) of a file descriptor
+    to (the current position of) another file descriptor in kernel.
+
+    :param infd: The file descriptor to copy from.
+    :param outfd: The file descriptor to copy to.
+    :param offset: The offset to start copying from.
+    :param end: The offset to stop copying at.
+    :return: The offset up to which bytes have been copied
+        (less than end if zero-copy is not supported for the file descriptors).
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            while offset < end:
+                count = os.copy_file_range(infd, outfd, end - offset, offset)
+                if count == 0:
+                    break
+                offset += count
+            return offset
+        except OSError:
+            pass
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        try:
+            while offset < end:
+                count = os.sendfile(outfd, infd, offset, end - offset)
+                if count == 0:
+                    break
+                offset += count
+        except OSError:
+            pass
+    return offset
+
+
 def _merge_with_headers(
     files: Union[str, Path, List[Union[str, Path]]],
-    output: Union[str, Path] = ""
+    output: Union[str, Path] = "",
+    ensure_newline: bool = False,
+    compresslevel: Union[int, None] = None,
+    threads: int = 0
 ) -> None:
     """Merge files with headers. Keep only one header.
 
     :param files: A list of files 
         or the path to a directory containing a list of files to merge.
     :param output: output files for merging the files.
+    :param ensure_newline: If true, append a newline to (the content of) a file
+        which does not end with a newline.
+    :param compresslevel: The compression level for compressed output.
+    :param threads: The number of threads for compressing output.
     """
-    with open(output, "wb") if output else sys.stdout.buffer as out:
-        with open(files[0], "rb") as fin0:
-            for line in fin0:
-                out.write(line)
-        for file in files[1:]:
-            with open(file, "rb") as fin:
-                fin.readline()
-                for line in fin:
-                    out.write(line)
+    with _open_output(output, compresslevel, threads) as fout:
+        for idx, file in enumerate(files):
+            with _open_input(file) as fin:
+                if idx:
+                    fin.readline()
+                last = _copy_file(fin, fout)
+            if ensure_newline and last not in (b"", b"\n"):
+                fout.write(b"\n")
 
 
 def _merge_without_header(
     files: Union[str, Path, List[Union[str, Path]]],
-    output: Union[str, Path] = ""
+    output: Union[str, Path] = "",
+    ensure_newline: bool = False,
+    compresslevel: Union[int, None] = None,
+    threads: int = 0
 ) -> None:
     """Merge files without header.
 
     :param files: A list of files 
         or the path to a directory containing a list of files to merge.
     :param output: output files for merging the files.
+    :param ensure_newline: If true, append a newline to a file which does not end with a newline.
+    :param compresslevel: The compression level for compressed output.
+    :param threads: The number of threads for compressing output.
     """
-    with open(output, "wb") if output else sys.stdout.buffer as fout:
+    with _open_output(output, compresslevel, threads) as fout:
         for file in files:
-            with open(file, "rb") as fin:
-                for line in fin:
-                    fout.write(line)
+            with _open_input(file) as fin:
+                last = _copy_file(fin, fout)
+            if ensure_newline and last not in (b"", b"\n"):
                 fout.write(b"\n")
 
 
+def _plan_merge(files: List[Union[str, Path]], header: bool,
+                ensure_newline: bool) -> List[Tuple[Union[str, Path], int, int, bool]]:
+    """Plan the merging of files.
+
+    :param files: A list of files to merge.
+    :param header: Whether the files have headers (only the header of the first file is kept).
+    :param ensure_newline: Whether to append a newline to a file which does not end with a newline.
+    :return: A list of tuples (file, offset, count, newline) which means that count bytes
+        starting from offset of file are copied (followed by a newline if newline is True).
+    """
+    plan = []
+    for idx, file in enumerate(files):
+        with open(file, "rb") as fin:
+            offset = len(fin.readline()) if header and idx else 0
+            size = os.fstat(fin.fileno()).st_size
+            newline = ensure_newline and size > offset and os.pread(
+                fin.fileno(), 1, size - 1
+            ) != b"\n"
+        plan.append((file, offset, size - offset, newline))
+    return plan
+
+
+def _copy_range_at(
+    file: Union[str, Path], offset: int, count: int, outfd: int, position: int
+) -> None:
+    """Copy a range of bytes of a file into the specified position of another file.
+
+    :param file: The file to copy from.
+    :param offset: The offset of the range to copy.
+    :param count: The number of bytes to copy.
+    :param outfd: The file descriptor to copy to.
+    :param position: The position (of outfd) to copy to.
+    """
+    with open(file, "rb") as fin:
+        infd = fin.fileno()
+        end = offset + count
+        if hasattr(os, "copy_file_range"):
+            try:
+                while offset < end:
+                    copied = os.copy_file_range(
+                        infd, outfd, end - offset, offset, position
+                    )
+                    if copied == 0:
+                        break
+                    offset += copied
+                    position += copied
+            except OSError:
+                pass
+        while offset < end:
+            data = os.pread(infd, min(BUFFER_SIZE, end - offset), offset)
+            if not data:
+                break
+            os.pwrite(outfd, data, position)
+            offset += len(data)
+            position += len(data)
+
+
+def _merge_parallel(
+    files: List[Union[str, Path]],
+    output: Union[str, Path],
+    header: bool,
+    ensure_newline: bool = False,
+    workers: int = 0
+) -> None:
+    """Merge files in parallel.
+    The size and the header offset of each file is computed first
+    so that a thread pool can write every file at its precomputed offset of the (preallocated) output.
+    The result is byte-identical to the sequential merging.
+
+    :param files: A list of files to merge.
+    :param output: The output file (must be a regular file).
+    :param header: Whether the files have headers (only the header of the first file is kept).
+    :param ensure_newline: Whether to append a newline to a file which does not end with a newline.
+    :param workers: The number of worker threads (0 means the default of ThreadPoolExecutor).
+    """
+    plan = _plan_merge(files, header, ensure_newline)
+    total = sum(count + newline for _, _, count, newline in plan)
+    with open(output, "wb") as fout:
+        outfd = fout.fileno()
+        os.ftruncate(outfd, total)
+        with ThreadPoolExecutor(
+            max_workers=workers if workers > 0 else None
+        ) as executor:
+            futures = []
+            position = 0
+            for file, offset, count, newline in plan:
+                # split large files into pieces to balance the workload
+                for start in range(offset, offset + count, PARALLEL_CHUNK_SIZE):
+                    size = min(PARALLEL_CHUNK_SIZE, offset + count - start)
+                    futures.append(
+                        executor.submit(
+                            _copy_range_at, file, start, size, outfd, position
+                        )
+                    )
+                    position += size
+                if newline:
+                    os.pwrite(outfd, b"\n", position)
+                    position += 1
+            for future in futures:
+                future.result()
+
+
 def merge(
     files: Union[str, Path, List[Union[str, Path]]],
     output: str = "",
-    num_files_checking: int = 5
+    num_files_checking: int = 5,
+    ensure_newline: bool = False,
+    workers: int = 1,
+    compresslevel: Union[int, None] = None,
+    threads: int = 0
 ) -> None:
     """Merge files. If there are headers in files, keep only one header in the single merged file.
+    The header of each file is skipped with a single readline
+    and the rest of the file is copied in bulk.
+    Compressed (gzip, bz2, zstd or xz) input files are decompressed transparently
+    and the output is compressed if it has the extension .gz, .bz2, .zst or .xz.
 
     :param files: A list of files 
         or the path to a directory containing a list of files to merge.
     :param output: output files for merging the files.
     :param num_files_checking: number of files for checking whether there are headers in files.
+    :param ensure_newline: If true, append a newline to (the content of) a file
+        which does not end with a newline
+        (so that the last line of a file is not joined with the first line of the next file).
+        Files are concatenated as they are by default.
+    :param workers: If greater than 1, files are written in parallel by this number of threads
+        at precomputed offsets of the output file (which is useful for NVMe and parallel filesystems).
+        This requires output to be a regular (uncompressed) file and input files to be uncompressed.
+    :param compresslevel: The compression level for compressed output.
+    :param threads: The number of threads for compressing output (where supported).
     """
     if isinstance(files, str):
         files = Path(files)
     if isinstance(files, Path):
-        files = list(files.iterdir())
+        files = _list_files(files)
     if num_files_checking <= 0:
         num_files_checking = 5
     num_files_checking = min(num_files_checking, len(files))
-    if has_header(files, num_files_checking):
-        _merge_with_headers(files, output)
+    header = has_header(files, num_files_checking)
+    if workers > 1 and output and hasattr(os, "pwrite"
+                                         ) and not _is_compressed(output, files):
+        _merge_parallel(files, output, header, ensure_newline, workers)
+        return
+    if header:
+        _merge_with_headers(files, output, ensure_newline, compresslevel, threads)
         return
-    _merge_without_header(files, output)
+    _merge_without_header(files, output, ensure_newline, compresslevel, threads)
+
+
+def _is_compressed(output: Union[str, Path], files: List[Union[str, Path]]) -> bool:
+    """Check whether the output or any of the input files is compressed.
+
+    :param output: The path of the output file.
+    :param files: A list of input files.
+    :return: True if the output or any of the input files is compressed and False otherwise.
+    """
+    return Path(output).suffix.lower() in SUFFIX_COMPRESSION or any(
+        _detect_compression(file) for file in files
+    )
+
+
+def _find_headers(file: Union[str, Path], pattern: bytes, start: int,
+                  end: int) -> List[int]:
+    """Find occurrences of a (newline-prefixed) header line in a range of a file.
+    An occurrence is owned by the range containing its starting position (the newline)
+    even if it spans over the end of the range.
+
+    :param file: The path to a (uncompressed) file.
+    :param pattern: The header line prefixed with a newline.
+    :param start: The start of the range to search.
+    :param end: The end of the range to search.
+    :return: A list of starting positions of occurrences in the range [start, end).
+    """
+    with open(file,
+              "rb") as fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _find_pattern(mm, pattern, start, end)
+
+
+def _find_pattern(data, pattern: bytes, start: int, end: int) -> List[int]:
+    """Find occurrences of a (newline-prefixed) header line in a range of a buffer.
+    Since a header line contains a newline only at its end,
+    the next occurrence can only start at the last byte of the current one.
 
+    :param data: A bytes-like object or a mmap object.
+    :param pattern: The header line prefixed with a newline.
+    :param start: The start of the range to search.
+    :param end: The end of the range to search.
+    :return: A list of starting positions of occurrences in the range [start, end).
+    """
+    positions = []
+    idx = data.find(pattern, start)
+    while 0 <= idx < end:
+        positions.append(idx)
+        idx = data.find(pattern, idx + len(pattern) - 1)
+    return positions
+
+
+def _kept_spans(positions: List[int], length: int, size: int) -> List[Tuple[int, int]]:
+    """Get the spans to keep after removing header lines.
+
+    :param positions: Starting positions (newlines) of occurrences of the newline-prefixed header.
+    :param length: The length of the newline-prefixed header.
+    :param size: The size of the file.
+    :return: A list of non-empty spans (start, end) to keep.
+    """
+    spans = []
+    pos = 0
+    for idx in positions:
+        if idx + 1 > pos:
+            spans.append((pos, idx + 1))
+        pos = idx + length
+    if size > pos:
+        spans.append((pos, size))
+    return spans
+
+
+def _dedup_header_stream(fin: BinaryIO, fout: BinaryIO, header: bytes) -> None:
+    """Remove header lines from a stream block by block.
+    The last few bytes of each block (which might be the beginning of a header line)
+    are carried over to the next block.
+
+    :param fin: A file object (positioned after the first header line) for reading.
+    :param fout: A file object for writing.
+    :param header: The header line (ending with a newline).
+    """
+    pattern = b"\n" + header
+    keep = len(pattern) - 1
+    # prev is the byte right before the unprocessed data
+    prev = header[-1:]
+    carry = b""
+    while True:
+        block = fin.read(BUFFER_SIZE)
+        buffer = prev + carry + block
+        view = memoryview(buffer)
+        pos = 1
+        for idx in _find_pattern(buffer, pattern, 0, len(buffer)):
+            fout.write(view[pos:idx + 1])
+            pos = idx + len(pattern)
+        if not block:
+            fout.write(view[pos:])
+            return
+        tail = max(pos, len(buffer) - keep)
+        fout.write(view[pos:tail])
+        prev = buffer[tail - 1:tail]
+        carry = buffer[tail:]
+
+
+def _dedup_header_mmap(file: Union[str, Path], fout: BinaryIO, header: bytes) -> None:
+    """Remove header lines from a (uncompressed) file using mmap.
+
+    :param file: The path to a (uncompressed) file.
+    :param fout: A file object for writing.
+    :param header: The header line (ending with a newline).
+    """
+    pattern = b"\n" + header
+    with open(file,
+              "rb") as fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        positions = _find_pattern(mm, pattern, 0, len(mm))
+        for start, end in _kept_spans(positions, len(pattern), len(mm)):
+            for offset in range(start, end, BUFFER_SIZE):
+                fout.write(mm[offset:min(offset + BUFFER_SIZE, end)])
 
-def dedup_header(file: Union[str, Path], output: Union[str, Path] = "") -> None:
+
+def _dedup_header_parallel(
+    file: Union[str, Path], output: Union[str, Path], header: bytes, workers: int
+) -> None:
+    """Remove header lines from a (uncompressed) file in parallel.
+    Chunks of the file are searched for header lines in worker processes.
+    The kept spans are then copied into their precomputed offsets of the output by a thread pool.
+    The result is byte-identical to the sequential deduplication.
+
+    :param file: The path to a (uncompressed) file.
+    :param output: The output file (must be a regular file).
+    :param header: The header line (ending with a newline).
+    :param workers: The number of workers.
+    """
+    pattern = b"\n" + header
+    size = os.path.getsize(file)
+    chunks = range(0, size, PARALLEL_CHUNK_SIZE)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _find_headers, file, pattern, start,
+                min(start + PARALLEL_CHUNK_SIZE, size)
+            ) for start in chunks
+        ]
+        positions = [pos for future in futures for pos in future.result()]
+    spans = _kept_spans(positions, len(pattern), size)
+    with open(output, "wb") as fout:
+        outfd = fout.fileno()
+        os.ftruncate(outfd, sum(end - start for start, end in spans))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            position = 0
+            for start, end in spans:
+                for offset in range(start, end, PARALLEL_CHUNK_SIZE):
+                    count = min(PARALLEL_CHUNK_SIZE, end - offset)
+                    futures.append(
+                        executor.submit(
+                            _copy_range_at, file, offset, count, outfd, position
+                        )
+                    )
+                    position += count
+            for future in futures:
+                future.result()
+
+
+def dedup_header(
+    file: Union[str, Path],
+    output: Union[str, Path] = "",
+    compresslevel: Union[int, None] = None,
+    threads: int = 0,
+    workers: int = 1
+) -> None:
     """Dedup headers in a file (due to the hadoop getmerge command).
     Only the header on the first line is kept and headers (identical line to the first line) 
     on other lines are removed.
+    Header lines are located with a block-level search of the newline-prefixed header
+    (using mmap for uncompressed files) instead of comparing line by line.
+    A compressed (gzip, bz2, zstd or xz) input file is decompressed transparently
+    and the output is compressed if it has the extension .gz, .bz2, .zst or .xz.
 
     :param file: The path to the file to be deduplicated.
     :param output: The path of the output file. 
         If empty, then output to the standard output.
+    :param compresslevel: The compression level for compressed output.
+    :param threads: The number of threads for compressing output (where supported).
+    :param workers: The number of workers for deduplicating the file in parallel.
+        This requires both the file and output to be regular (uncompressed) files.
     """
-    with open(file, "rb"
-             ) as fin, open(output, "wb") if output else sys.stdout.buffer as fout:
+    compressed = _detect_compression(file)
+    with _open_input(file) as fin:
+        header = fin.readline()
+    if not compressed and os.path.getsize(file) > len(header
+                                                     ) and header.endswith(b"\n"):
+        if workers > 1 and output and not _is_compressed(output, []):
+            _dedup_header_parallel(file, output, header, workers)
+            return
+        with _open_output(output, compresslevel, threads) as fout:
+            _dedup_header_mmap(file, fout, header)
+        return
+    with _open_input(file) as fin, _open_output(output, compresslevel, threads) as fout:
         header = fin.readline()
         fout.write(header)
-        for line in fin:
-            if line != header:
-                fout.write(line)
+        if header.endswith(b"\n"):
+            _dedup_header_stream(fin, fout, header)
+
+
+def _record_boundary(buffer: bytes, quotechar: bytes = b'"') -> int:
+    """Find the end of the last complete record in a buffer starting at a record boundary.
+    A newline ends a record only if it is not inside a quoted field,
+    i.e., if the number of quote characters before it is even.
+
+    :param buffer: A buffer starting at a record boundary.
+    :param quotechar: The quote character.
+    :return: The position right after the last complete record (0 if there is none).
+    """
+    quotes = buffer.count(quotechar)
+    end = len(buffer)
+    while True:
+        pos = buffer.rfind(b"\n", 0, end)
+        if pos < 0:
+            return 0
+        quotes -= buffer.count(quotechar, pos, end)
+        if quotes % 2 == 0:
+            return pos + 1
+        end = pos
+
+
+def _iter_records(fin: BinaryIO) -> Iterator[bytes]:
+    """Read a delimited file in large chunks of complete records.
+    If no record boundary is found in more than MAX_RECORD_SIZE bytes
+    (e.g., due to a stray quote like 5" in an unquoted field),
+    the buffer is split at its last newline instead (with a warning).
+
+    :param fin: A file object for reading bytes.
+    :yield: Chunks of bytes each of which consists of complete records.
+    """
+    carry = b""
+    while True:
+        block = fin.read(BUFFER_SIZE)
+        if not block:
+            if carry:
+                yield carry
+            return
+        buffer = carry + block
+        pos = _record_boundary(buffer)
+        if not pos and len(buffer) > MAX_RECORD_SIZE:
+            pos = buffer.rfind(b"\n") + 1
+            if pos:
+                logger.warning(
+                    "No record boundary is found in {:,} bytes (possibly due to "
+                    "an unbalanced quote), splitting records by newlines.", pos
+                )
+        if pos:
+            yield buffer[:pos]
+        carry = buffer[pos:]
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_numeric(op: str, value) -> bool:
+    """Check whether a predicate compares fields as numbers.
+
+    :param op: The operator of the predicate.
+    :param value: The value of the predicate.
+    :return: True if fields are compared as numbers and False if compared as strings.
+    """
+    if op == "regex":
+        return False
+    if op == "between":
+        return _is_number(value[0])
+    if op in ("in", "not in"):
+        return all(_is_number(val) for val in value)
+    return _is_number(value)
+
+
+def _check_where(where: List[Tuple[str, str, Any]], header: List[str]) -> None:
+    """Check predicates of a row filter.
+
+    :param where: A list of predicates (column, op, value).
+    :param header: The header of the delimited file.
+    :raises ValueError: If a column is not in the header or an operator is not supported.
+    """
+    for column, op, _ in where:
+        if column not in header:
+            raise ValueError(f"The column {column} is not in the header!")
+        if op not in OPERATORS:
+            raise ValueError(
+                f"The operator {op} is not supported! Supported operators: {OPERATORS}"
+            )
+
+
+def _compile_predicate(op: str, value) -> Callable[[str], bool]:
+    """Compile a predicate into a function on (the string value of) a field.
+
+    :param op: The operator of the predicate.
+    :param value: The value of the predicate.
+    :return: A function checking whether a field satisfies the predicate.
+    """
+    if op == "regex":
+        return re.compile(value).search
+    numeric = _is_numeric(op, value)
+    if op == "between":
+        low, high = (float(val) for val in value) if numeric else value
+        compare = lambda field: low <= field <= high
+    elif op in ("in", "not in"):
+        values = frozenset(float(val) for val in value) if numeric else frozenset(value)
+        compare = values.__contains__ if op == "in" else lambda field: field not in values
+    else:
+        fun = COMPARISONS[op]
+        value = float(value) if numeric else value
+        compare = lambda field: fun(field, value)
+    if not numeric:
+        return compare
+
+    def _compare_number(field: str) -> bool:
+        # the same rule as the pyarrow engine, e.g., " 5", "inf" and "1_000" are not numbers
+        if NUMBER_REGEX.fullmatch(field) is None:
+            return False
+        return compare(float(field))
+
+    return _compare_number
+
+
+def _compile_where(where: List[Tuple[int, str, Any]]) -> Tuple[Callable, Callable]:
+    """Compile predicates of a row filter.
+
+    :param where: A list of predicates (index of column, op, value).
+    :return: A tuple of 2 functions.
+        The first one checks whether a chunk (of text) might contain any matching row
+        (e.g., a string compared for equality must occur in the chunk)
+        so that chunks without matching rows are skipped without being parsed.
+        The second one checks whether a row (a list of fields) satisfies all predicates.
+    """
+    checks = []
+    for _, op, value in where:
+        if _is_numeric(op, value):
+            continue
+        # a quote in a value is escaped (doubled) in the text
+        if op == "==" and '"' not in value:
+            checks.append(lambda text, value=value: value in text)
+        elif op == "in" and not any('"' in val for val in value):
+            checks.append(lambda text, values=value: any(val in text for val in values))
+    predicates = [(idx, _compile_predicate(op, value)) for idx, op, value in where]
+
+    def _check_chunk(text: str) -> bool:
+        return all(check(text) for check in checks)
+
+    def _check_row(row: List[str]) -> bool:
+        size = len(row)
+        return all(pred(row[idx] if idx < size else "") for idx, pred in predicates)
+
+    return _check_chunk, _check_row
+
+
+def _select_records(
+    chunk: bytes,
+    index: List[int],
+    delimiter: str,
+    where: Sequence[Tuple[int, str, Any]] = ()
+) -> bytes:
+    """Select fields from (filtered) rows in a chunk of delimited records.
+
+    :param chunk: A chunk of complete records.
+    :param index: Indexes of fields to select (in order).
+    :param delimiter: The delimiter of fields.
+    :param where: A list of predicates (index of column, op, value) to filter rows.
+    :return: The selected fields as a chunk of delimited records.
+    """
+    text = chunk.decode("utf-8")
+    check_chunk, check_row = _compile_where(where)
+    if not check_chunk(text):
+        return b""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\n")
+    for row in csv.reader(io.StringIO(text, newline=""), delimiter=delimiter):
+        if not row or not check_row(row):
+            continue
+        size = len(row)
+        writer.writerow([row[idx] if idx < size else "" for idx in index])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _arrow_mask(batch, where: List[Tuple[str, str, Any]]):
+    """Evaluate predicates of a row filter on a record batch in a vectorized way.
+
+    :param batch: A pyarrow.RecordBatch of string columns.
+    :param where: A list of predicates (column, op, value).
+    :return: A boolean pyarrow.Array.
+    """
+    mask = None
+    for column, op, value in where:
+        array = batch.column(batch.schema.get_field_index(column))
+        if _is_numeric(op, value):
+            # non-numeric fields become nulls which never match
+            numeric = pc.match_substring_regex(array, pattern=NUMBER_PATTERN)
+            array = pc.cast(
+                pc.if_else(numeric, array, pa.scalar(None, pa.string())), pa.float64()
+            )
+        if op == "regex":
+            cond = pc.match_substring_regex(array, pattern=value)
+        elif op == "between":
+            cond = pc.and_(
+                pc.greater_equal(array, value[0]), pc.less_equal(array, value[1])
+            )
+        elif op in ("in", "not in"):
+            cond = pc.is_in(array, value_set=pa.array(list(value), type=array.type))
+            if op == "not in":
+                cond = pc.invert(cond)
+        else:
+            cond = {
+                "==": pc.equal,
+                "!=": pc.not_equal,
+                "<": pc.less,
+                "<=": pc.less_equal,
+                ">": pc.greater,
+                ">=": pc.greater_equal,
+            }[op](array, value)
+        mask = cond if mask is None else pc.and_(mask, cond)
+    return mask
+
+
+def _select_arrow(
+    path: Union[str, Path],
+    columns: List[str],
+    delimiter: str,
+    fout: BinaryIO,
+    where: Sequence[Tuple[str, str, Any]] = ()
+) -> None:
+    """Select fields (of filtered rows) from a delimited file
+    using the streaming CSV reader of pyarrow.
+
+    :param path: The path to a (possibly compressed) delimited file.
+    :param columns: A list of columns to select (in order).
+    :param delimiter: The delimiter of fields.
+    :param fout: A file object for writing.
+    :param where: A list of predicates (column, op, value) to filter rows.
+    """
+    names = list(dict.fromkeys(columns + [column for column, _, _ in where]))
+    with _open_input(path) as fin:
+        reader = pacsv.open_csv(
+            fin,
+            read_options=pacsv.ReadOptions(block_size=BUFFER_SIZE),
+            parse_options=pacsv.ParseOptions(
+                delimiter=delimiter, newlines_in_values=True
+            ),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=names,
+                column_types={name: pa.string()
+                              for name in names},
+                strings_can_be_null=False,
+            ),
+        )
+        schema = pa.schema([reader.schema.field(column) for column in columns])
+        with pacsv.CSVWriter(
+            fout, schema, write_options=pacsv.WriteOptions(delimiter=delimiter)
+        ) as writer:
+            for batch in reader:
+                if where:
+                    batch = batch.filter(_arrow_mask(batch, where))
+                writer.write_batch(
+                    pa.RecordBatch.from_arrays(
+                        [
+                            batch.column(batch.schema.get_field_index(column))
+                            for column in columns
+                        ],
+                        schema=schema
+                    )
+                )
 
 
 def select(
     path: Union[str, Path],
-    columns: Union[str, List[str]],
+    columns: Union[str, List[str], None],
     delimiter: str,
-    output: str = ""
+    output: str = "",
+    compresslevel: Union[int, None] = None,
+    threads: int = 0,
+    workers: int = 1,
+    engine: str = "python",
+    where: Sequence[Tuple[str, str, Any]] = ()
 ):
     """Select fields by name from a delimited file (not necessarily well structured).
+    Fields are parsed in a quote-aware way (a quoted field might contain delimiters and newlines),
+    selected in the order of columns and missing fields are treated as empty strings.
+    Rows can be filtered (in the same pass) by predicates on named columns.
+    The file is processed in large chunks of complete records
+    which are parsed in worker processes (if workers > 1) with the output order preserved.
+    A compressed (gzip, bz2, zstd or xz) input file is decompressed transparently
+    and the output is compressed if it has the extension .gz, .bz2, .zst or .xz.
 
     :param path: To path to a file (containing delimited values in each row).
-    :param columns: A list of columns to extract from the file.
-    :param delimiter: The delimiter of fields.
+    :param columns: A list of columns to extract from the file (all columns if None).
+    :param delimiter: The delimiter (a single character) of fields.
     :param output: The path of the output file. 
         If empty, then output to the standard output.
+    :param compresslevel: The compression level for compressed output.
+    :param threads: The number of threads for compressing output (where supported).
+    :param workers: The number of worker processes for parsing chunks.
+    :param engine: The engine (python or pyarrow) to use.
+        The pyarrow engine is faster (predicates are evaluated on arrays)
+        but requires well structured rows and quotes all fields in the output.
+    :param where: A list of predicates (column, op, value) which rows must all satisfy,
+        where op is one of ==, !=, <, <=, >, >=, in, not in, regex and between
+        (value is a tuple (low, high) of inclusive bounds).
+        Fields are compared as numbers if value is a number (or a collection of numbers)
+        and as strings otherwise.
+        Only fields in plain decimal notation (e.g., -1.5 or 2e3) are numbers
+        (which never match a numeric predicate otherwise)
+        and regex is the syntax of the module re with the python engine
+        but the RE2 syntax (e.g., without lookarounds or backreferences)
+        with the pyarrow engine.
+        For example, [("age", ">=", 18), ("state", "in", {"CA", "WA"})].
+    :raises ValueError: If any of the columns is not in the header
+        or the engine or an operator is not supported.
     """
-    if isinstance(path, str):
-        path = Path(path)
     if isinstance(columns, str):
         columns = [columns]
-    with path.open("r", encoding="utf-8") as fin:
-        header = fin.readline().split(delimiter)
-        index = []
-        columns_full = []
-        for idx, field in enumerate(header):
-            if field in columns:
-                index.append(idx)
-                columns_full.append(field)
-        with (open(output, "w", encoding="utf-8") if output else sys.stdout) as fout:
-            fout.write(delimiter.join(columns_full) + "\n")
-            for line in fin:
-                fields = line.split(delimiter)
-                fout.write(delimiter.join([fields[idx] for idx in index]) + "\n")
-
-
-def prune_json(input: Union[str, Path], output: Union[str, Path] = ""):
-    """Prune fields (value_counts) from a JSON file.
+    if engine not in ("python", "pyarrow"):
+        raise ValueError(f"The engine {engine} is not supported!")
+    where = list(where)
+    with _open_input(path) as fin:
+        header = next(
+            csv.reader([fin.readline().decode("utf-8")], delimiter=delimiter), []
+        )
+        if columns is None:
+            columns = header
+        missing = [column for column in columns if column not in header]
+        if missing:
+            raise ValueError(f"The columns {missing} are not in the header of {path}!")
+        _check_where(where, header)
+        index = [header.index(column) for column in columns]
+        where_index = [(header.index(column), op, value) for column, op, value in where]
+        with _open_output(output, compresslevel, threads) as fout:
+            if engine == "pyarrow":
+                _select_arrow(path, columns, delimiter, fout, where)
+                return
+            buffer = io.StringIO()
+            csv.writer(buffer, delimiter=delimiter,
+                       lineterminator="\n").writerow(columns)
+            fout.write(buffer.getvalue().encode("utf-8"))
+            if workers <= 1:
+                for chunk in _iter_records(fin):
+                    fout.write(_select_records(chunk, index, delimiter, where_index))
+                return
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = deque()
+                for chunk in _iter_records(fin):
+                    pending.append(
+                        executor.submit(
+                            _select_records, chunk, index, delimiter, where_index
+                        )
+                    )
+                    if len(pending) >= 2 * workers:
+                        fout.write(pending.popleft().result())
+                while pending:
+                    fout.write(pending.popleft().result())
+
+
+def filter_rows(
+    path: Union[str, Path],
+    where: Sequence[Tuple[str, str, Any]],
+    delimiter: str,
+    output: str = "",
+    **kwargs
+):
+    """Filter rows of a delimited file by predicates on named columns (keeping all columns).
+
+    :param path: To path to a file (containing delimited values in each row).
+    :param where: A list of predicates (column, op, value) which rows must all satisfy.
+        Please refer to select for details.
+    :param delimiter: The delimiter (a single character) of fields.
+    :param output: The path of the output file. 
+        If empty, then output to the standard output.
+    :param kwargs: Other keyword arguments (compresslevel, threads, workers and engine) to pass to select.
+    """
+    select(path, None, delimiter, output, where=where, **kwargs)
+
+
+def _iter_json_tokens(fin: TextIO) -> Iterator[str]:
+    """Tokenize a JSON stream (of any layout) in constant memory.
+    Each block is tokenized by a single regular expression scan
+    and the last token (which might continue in the next block) is carried over.
+
+    :param fin: A file object for reading text.
+    :return: An iterator of JSON tokens (strings, numbers, literals and punctuations).
+    """
+    return itertools.chain.from_iterable(_iter_json_token_blocks(fin))
+
+
+def _iter_json_token_blocks(fin: TextIO) -> Iterator[List[str]]:
+    """Tokenize a JSON stream block by block.
+
+    :param fin: A file object for reading text.
+    :yield: Lists of JSON tokens.
+    :raises ValueError: If the stream ends with an incomplete token.
+    """
+    carry = ""
+    while True:
+        block = fin.read(JSON_BLOCK_SIZE)
+        buffer = carry + block
+        # matches are tuples (whitespaces, token, stray character)
+        matches = JSON_TOKEN.findall(buffer)
+        tokens = [token for _, token, _ in matches]
+        # a stray character (e.g., the quote of an unterminated string) has an empty token
+        try:
+            end = tokens.index("")
+        except ValueError:
+            end = len(tokens)
+        if not block:
+            if end < len(tokens):
+                raise ValueError(f"Invalid JSON near: {carry[:80]}")
+            yield tokens
+            return
+        end = max(min(end, len(tokens) - 1), 0)
+        tail = sum(
+            len(ws) + len(token) + len(stray) for ws, token, stray in matches[end:]
+        )
+        carry = buffer[len(buffer.rstrip()) - tail:]
+        yield tokens[:end]
+
+
+def _skip_json_value(tokens: Iterator[str]) -> None:
+    """Skip a JSON value (a scalar or a nested object/array) from a stream of tokens.
+
+    :param tokens: An iterator of JSON tokens.
+    """
+    if next(tokens) not in ("{", "["):
+        return
+    depth = 1
+    for token in tokens:
+        if token in ("{", "["):
+            depth += 1
+        elif token in ("}", "]"):
+            depth -= 1
+            if depth == 0:
+                return
+
+
+def _match_json_path(path: List[str], patterns: Sequence[str]) -> bool:
+    """Check whether a key path matches any of the patterns.
+    A pattern containing dots (e.g., variables.*.histogram) is matched against the whole path
+    (keys joined by dots, array indexes omitted)
+    and a pattern without dots (e.g., value_counts) is matched against the last key.
+
+    :param path: A list of keys from the root.
+    :param patterns: A list of glob patterns of key paths.
+    :return: True if the path matches any of the patterns and False otherwise.
+    """
+    joined = ".".join(path)
+    return any(
+        fnmatch.fnmatchcase(joined if "." in pattern else path[-1], pattern)
+        for pattern in patterns
+    )
+
+
+def _prune_json_tokens(tokens: Iterator[str], patterns: Sequence[str]) -> Iterator[str]:
+    """Remove members whose key paths match patterns from a stream of JSON tokens.
+    Commas are regenerated so that the output is valid compact JSON.
+
+    :param tokens: An iterator of JSON tokens.
+    :param patterns: A list of glob patterns of key paths to remove.
+    :yield: JSON tokens of the pruned JSON.
+    """
+    # each frame is [is_object, number of emitted members, expecting a key]
+    frames = []
+    # the current key of each frame (None for arrays)
+    keys = []
+    for token in tokens:
+        if token in (",", ":"):
+            continue
+        if token in ("}", "]"):
+            frames.pop()
+            keys.pop()
+            yield token
+            continue
+        frame = frames[-1] if frames else None
+        if frame and frame[0] and frame[2]:
+            keys[-1] = json.loads(token)
+            if _match_json_path([key for key in keys if key is not None], patterns):
+                # skip the colon and then the value
+                next(tokens)
+                _skip_json_value(tokens)
+                continue
+            yield ("," if frame[1] else "") + token + ":"
+            frame[1] += 1
+            frame[2] = False
+            continue
+        if frame:
+            if frame[0]:
+                frame[2] = True
+            else:
+                if frame[1]:
+                    yield ","
+                frame[1] += 1
+        yield token
+        if token in ("{", "["):
+            frames.append([token == "{", 0, True])
+            keys.append(None)
+
+
+def prune_json(
+    input: Union[str, Path],
+    output: Union[str, Path] = "",
+    keys: Sequence[str] = ("value_counts", ),
+    compresslevel: Union[int, None] = None,
+    threads: int = 0
+):
+    """Prune fields (e.g., value_counts) from a JSON file.
+    The JSON file (of any layout) is processed by a streaming tokenizer in constant memory
+    and the pruned JSON is written in the compact format.
+    A compressed (gzip, bz2, zstd or xz) input file is decompressed transparently
+    and the output is compressed if it has the extension .gz, .bz2, .zst or .xz.
 
     :param input: The path to a JSON file to be pruned.
     :param output: The path to output the pruned JSON file.
+    :param keys: Glob patterns of key paths of fields to prune.
+        A pattern without dots (e.g., value_counts) matches the key at any depth
+        and a pattern with dots (e.g., variables.*.histogram) matches the path of keys from the root.
+        For a JSON report of pandas-profiling,
+        value_counts*, histogram*, sample and messages are large fields which are commonly pruned.
+    :param compresslevel: The compression level for compressed output.
+    :param threads: The number of threads for compressing output (where supported).
     """
-    logger.info("Pruning the JSON fiel at {}...", input)
+    logger.info("Pruning the JSON file at {}...", input)
     if isinstance(input, str):
         input = Path(input)
     if isinstance(output, str):
@@ -168,16 +1306,1480 @@ def prune_json(input: Union[str, Path], output: Union[str, Path] = ""):
             output = Path(output)
         else:
             output = input.with_name(input.stem + "_prune.json")
-    skip = False
-    with input.open("r") as fin, output.open("w") as fout:
+    if isinstance(keys, str):
+        keys = [keys]
+    with io.TextIOWrapper(_open_input(input), encoding="utf-8") as fin, \
+            _open_output(output, compresslevel, threads) as fout:
+        pieces = []
+        size = 0
+        for token in _prune_json_tokens(_iter_json_tokens(fin), keys):
+            pieces.append(token)
+            size += len(token)
+            if size >= BUFFER_SIZE:
+                fout.write("".join(pieces).encode("utf-8"))
+                pieces = []
+                size = 0
+        fout.write("".join(pieces).encode("utf-8"))
+    logger.info("The pruned JSON file is written to {}.", output)
+
+
+def _iter_line_chunks(fin: BinaryIO, size: int) -> Iterator[bytes]:
+    """Read a file in chunks of complete lines.
+
+    :param fin: A file object for reading bytes.
+    :param size: The (approximate) size of each chunk.
+    :yield: Chunks of bytes each of which consists of complete lines
+        (except that the last line of the file might not end with a newline).
+    """
+    carry = b""
+    while True:
+        block = fin.read(size)
+        if not block:
+            if carry:
+                yield carry
+            return
+        buffer = carry + block
+        pos = buffer.rfind(b"\n") + 1
+        if pos:
+            yield buffer[:pos]
+        carry = buffer[pos:]
+
+
+def _sort_key(index: Sequence[int], delimiter: str,
+              numeric: bool) -> Callable[[str], Any]:
+    """Get the key function for sorting lines.
+
+    :param index: Indexes of key fields (the whole line is the key if empty).
+    :param delimiter: The delimiter of fields.
+    :param numeric: Whether to compare keys as numbers
+        (non-numeric keys are placed after numeric ones and compared as strings).
+    :return: A function computing the key of a line.
+    """
+    def _fields(line: str) -> List[str]:
+        if not index:
+            return [line.rstrip("\r\n")]
+        fields = _split_fields(line, delimiter)
+        size = len(fields)
+        return [fields[idx] if idx < size else "" for idx in index]
+
+    if not numeric:
+        if not index:
+            return operator.methodcaller("rstrip", "\r\n")
+        return lambda line: tuple(_fields(line))
+
+    def _number(field: str) -> Tuple[int, float, str]:
+        try:
+            return 0, float(field), ""
+        except ValueError:
+            return 1, 0.0, field
+
+    return lambda line: tuple(map(_number, _fields(line)))
+
+
+def _split_fields(line: str, delimiter: str) -> List[str]:
+    """Split a line into fields (in a quote-aware way if the line contains quotes).
+
+    :param line: A line of a delimited file.
+    :param delimiter: The delimiter of fields.
+    :return: A list of fields.
+    """
+    line = line.rstrip("\r\n")
+    if '"' not in line:
+        return line.split(delimiter) if line else []
+    return next(csv.reader([line], delimiter=delimiter), [])
+
+
+def _key_index(key: Union[int, str, Sequence[Union[int, str]], None],
+               names: List[str]) -> List[int]:
+    """Resolve key columns into indexes of fields.
+
+    :param key: Key columns (0-based indexes or names in the header).
+        The whole line is the key if None.
+    :param names: Names of columns (from the header).
+    :return: A list of indexes of key fields (empty if the whole line is the key).
+    :raises ValueError: If a key column is not found.
+    """
+    if key is None:
+        return []
+    if isinstance(key, (int, str)):
+        key = [key]
+    index = []
+    for col in key:
+        if isinstance(col, int):
+            index.append(col)
+        elif col in names:
+            index.append(names.index(col))
+        else:
+            raise ValueError(f"The key column {col} is not found!")
+    return index
+
+
+def _iter_unique(lines: Iterator[str], key: Callable[[str], Any]) -> Iterator[str]:
+    """Keep only the first line of consecutive lines with the same key.
+
+    :param lines: An iterator of sorted lines.
+    :param key: The key function.
+    :yield: Lines with distinct keys.
+    """
+    last = object()
+    for line in lines:
+        current = key(line)
+        if current != last:
+            last = current
+            yield line
+
+
+def _open_run(path: str, mode: str) -> TextIO:
+    """Open a (temporary) run file of the external merge sort.
+    Lines are terminated by "\n" only and written back byte for byte
+    (e.g., "\r\n" and a lone "\r" are kept as they are).
+
+    :param path: The path of the run file.
+    :param mode: The mode (r or w) to open the file.
+    :return: A file object for reading or writing text.
+    """
+    return open(
+        path,
+        mode,
+        encoding="utf-8",
+        errors="surrogateescape",
+        newline="\n",
+        buffering=MERGE_BUFFER_SIZE
+    )
+
+
+def _sort_run(
+    chunk: bytes, path: str, index: Sequence[int], delimiter: str, numeric: bool,
+    unique: bool, reverse: bool
+) -> str:
+    """Sort a chunk of lines in memory and spill it into a (temporary) run file.
+
+    :param chunk: A chunk of complete lines.
+    :param path: The path of the run file.
+    :param index: Indexes of key fields (the whole line is the key if empty).
+    :param delimiter: The delimiter of fields.
+    :param numeric: Whether to compare keys as numbers.
+    :param unique: Whether to keep only the first line of lines with the same key.
+    :param reverse: Whether to sort in the descending order.
+    :return: The path of the run file.
+    """
+    # split on "\n" only (str.splitlines also splits on "\r", "\x0c", "\u2028", etc.)
+    lines = chunk.decode("utf-8", errors="surrogateescape").split("\n")
+    last = lines.pop()
+    lines = [line + "\n" for line in lines]
+    if last:
+        lines.append(last + "\n")
+    key = _sort_key(index, delimiter, numeric)
+    lines.sort(key=key, reverse=reverse)
+    if unique:
+        lines = _iter_unique(lines, key)
+    with _open_run(path, "w") as fout:
+        fout.writelines(lines)
+    return path
+
+
+def _merge_runs(
+    runs: List[str], fout: TextIO, index: Sequence[int], delimiter: str, numeric: bool,
+    unique: bool, reverse: bool
+) -> None:
+    """Merge sorted runs using a k-way heap merge.
+    The merge is stable, i.e., lines with the same key are kept in the order of runs.
+
+    :param runs: Paths of sorted run files.
+    :param fout: A file object for writing text.
+    :param index: Indexes of key fields (the whole line is the key if empty).
+    :param delimiter: The delimiter of fields.
+    :param numeric: Whether to compare keys as numbers.
+    :param unique: Whether to keep only the first line of lines with the same key.
+    :param reverse: Whether the runs are sorted in the descending order.
+    """
+    key = _sort_key(index, delimiter, numeric)
+    with ExitStack() as stack:
+        files = [stack.enter_context(_open_run(run, "r")) for run in runs]
+        lines = heapq.merge(*files, key=key, reverse=reverse)
+        if unique:
+            lines = _iter_unique(lines, key)
+        fout.writelines(lines)
+
+
+def sort(
+    path: Union[str, Path],
+    output: Union[str, Path] = "",
+    key: Union[int, str, Sequence[Union[int, str]], None] = None,
+    delimiter: str = ",",
+    header: bool = False,
+    numeric: bool = False,
+    unique: bool = False,
+    reverse: bool = False,
+    memory: int = 1024**3,
+    workers: int = 1,
+    tmp_dir: Union[str, Path, None] = None,
+    compresslevel: Union[int, None] = None,
+    threads: int = 0
+) -> None:
+    """Sort lines of a (possibly larger than memory) text file using an external merge sort.
+    Chunks of lines within the memory budget are sorted (in worker processes if workers > 1)
+    and spilled into temporary run files which are then combined by a k-way heap merge.
+    The sort is stable.
+    A compressed (gzip, bz2, zstd or xz) input file is decompressed transparently
+    and the output is compressed if it has the extension .gz, .bz2, .zst or .xz.
+
+    :param path: The path to a text file.
+    :param output: The path of the output file.
+        If empty, then output to the standard output.
+    :param key: Key columns (0-based indexes or names if there is a header) to sort by.
+        The whole line is the key if None.
+    :param delimiter: The delimiter (a single character) of fields.
+    :param header: Whether the file has a header line (which is kept as the first line).
+    :param numeric: Whether to compare keys as numbers
+        (non-numeric keys are placed after numeric ones and compared as strings).
+    :param unique: Whether to keep only the first line of lines with the same key (like sort -u).
+    :param reverse: Whether to sort in the descending order.
+    :param memory: The (approximate) memory budget in bytes.
+    :param workers: The number of worker processes for sorting runs.
+    :param tmp_dir: The directory for temporary run files (the default temporary directory if None).
+    :param compresslevel: The compression level for compressed output.
+    :param threads: The number of threads for compressing output (where supported).
+    :raises ValueError: If a key column is not found.
+    """
+    workers = max(workers, 1)
+    # the in-memory representation of lines is a few times larger than the raw bytes
+    chunk_size = max(memory // (4 * workers), 1)
+    with _open_input(path) as fin, tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        first_line = fin.readline() if header else b""
+        index = _key_index(key, _split_fields(first_line.decode("utf-8"), delimiter))
+        args = (index, delimiter, numeric, unique, reverse)
+        runs = []
+        with ProcessPoolExecutor(max_workers=workers
+                                ) if workers > 1 else nullcontext() as executor:
+            pending = deque()
+            for idx, chunk in enumerate(_iter_line_chunks(fin, chunk_size)):
+                run = os.path.join(tmp, f"run-{idx:05d}")
+                if executor is None:
+                    runs.append(_sort_run(chunk, run, *args))
+                    continue
+                pending.append(executor.submit(_sort_run, chunk, run, *args))
+                if len(pending) >= workers:
+                    runs.append(pending.popleft().result())
+            runs.extend(future.result() for future in pending)
+        # merge runs in multiple passes if there are too many of them
+        level = 0
+        while len(runs) > MAX_MERGE_FILES:
+            level += 1
+            merged = []
+            for idx in range(0, len(runs), MAX_MERGE_FILES):
+                run = os.path.join(tmp, f"run-{level}-{idx:05d}")
+                with _open_run(run, "w") as fout:
+                    _merge_runs(runs[idx:idx + MAX_MERGE_FILES], fout, *args)
+                merged.append(run)
+            runs = merged
+        with _open_output(output, compresslevel, threads) as fout:
+            fout.write(first_line)
+            writer = io.TextIOWrapper(
+                fout, encoding="utf-8", errors="surrogateescape", newline="\n"
+            )
+            _merge_runs(runs, writer, *args)
+            # detach (instead of close) so that the output is closed by its own context manager
+            writer.detach()
+
+
+class LineIndex:
+    """A persistent index of line offsets for random access into a (huge) text file.
+    The byte offset of every step-th line is recorded into a compact NumPy side file
+    (<file>.lidx.npz by default) so that a line is located by a single seek
+    followed by reading at most step - 1 lines.
+    The side file is reused and extended incrementally if the file has been appended to
+    (detected by the size and the checksum of the tail of the indexed part)
+    and rebuilt otherwise.
+    If the side file cannot be written (e.g., the directory is read-only),
+    the index is kept in memory only.
+    """
+    def __init__(
+        self,
+        path: Union[str, Path],
+        step: int = 1024,
+        index_path: Union[str, Path, None] = None,
+        encoding: str = "utf-8",
+        index_dir: Union[str, Path, None] = None
+    ):
+        """Initialize a LineIndex (loading, extending or building the side file).
+
+        :param path: The path to an uncompressed text file.
+        :param step: Record the offset of every step-th line.
+        :param index_path: The path of the side file
+            (<index_dir>/<name>.lidx.npz if None).
+        :param encoding: The encoding for decoding lines.
+        :param index_dir: The directory of the side file
+            (the directory of the file if None).
+        :raises ValueError: If the file is compressed.
+        """
+        self.path = Path(path)
+        if _detect_compression(self.path):
+            raise ValueError(
+                f"Random access into the compressed file {path} is not supported!"
+            )
+        self.step = step
+        if index_path is None:
+            index_dir = Path(index_dir) if index_dir else self.path.parent
+            index_path = index_dir / (self.path.name + ".lidx.npz")
+        self.index_path = Path(index_path)
+        self.encoding = encoding
+        # offsets[i] is the byte offset of the line i * step
+        self.offsets = np.zeros(1, dtype=np.int64)
+        # the number of complete lines in the indexed part (i.e., [0, size)) of the file
+        self.num_lines = 0
+        self.size = 0
+        self.checksum = 0
+        # the size of the file when it was last scanned (size plus a trailing partial line)
+        self.scanned = 0
+        self._file_size = 0
+        self._in_memory = False
+        self.update()
+
+    def _tail_checksum(self, fin: BinaryIO, size: int) -> int:
+        start = max(size - LINE_INDEX_CHECKSUM_SIZE, 0)
+        fin.seek(start)
+        return zlib.crc32(fin.read(size - start))
+
+    def _load(self, fin: BinaryIO) -> bool:
+        """Load the side file if it is valid for (a prefix of) the file.
+
+        :param fin: The file object of the text file.
+        :return: True if the side file is loaded and False otherwise.
+        """
+        if self._in_memory or not self.index_path.is_file():
+            return False
+        with np.load(self.index_path) as data:
+            if data["meta"].size != 5:
+                return False
+            step, size, num_lines, checksum, scanned = (
+                int(val) for val in data["meta"]
+            )
+            if step != self.step or size > self._file_size or checksum != self._tail_checksum(
+                fin, size
+            ):
+                return False
+            self.offsets = data["offsets"]
+        self.size = size
+        self.num_lines = num_lines
+        self.checksum = checksum
+        self.scanned = scanned
+        return True
+
+    def _save(self) -> None:
+        if self._in_memory:
+            return
+        meta = np.array(
+            [self.step, self.size, self.num_lines, self.checksum, self.scanned],
+            dtype=np.int64
+        )
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.index_path, "wb") as fout:
+                np.savez(fout, offsets=self.offsets, meta=meta)
+        except OSError as err:
+            logger.warning(
+                "Failed to write the line index {} ({}), keeping it in memory only.",
+                self.index_path, err
+            )
+            self._in_memory = True
+
+    def update(self) -> "LineIndex":
+        """Load the side file and extend it with lines appended to the file (if any).
+
+        :return: The LineIndex itself.
+        """
+        with open(self.path, "rb") as fin:
+            self._file_size = os.fstat(fin.fileno()).st_size
+            # fall back to the index in memory if it is valid for (a prefix of) the file
+            if not self._load(fin) and (
+                self.size > self._file_size or
+                self.checksum != self._tail_checksum(fin, self.size)
+            ):
+                self.offsets = np.zeros(1, dtype=np.int64)
+                self.num_lines = self.size = self.checksum = self.scanned = 0
+            if self._file_size == self.scanned and (
+                self._in_memory or self.index_path.is_file()
+            ):
+                return self
+            # resume from the end of the last complete line
+            fin.seek(self.size)
+            offsets = [self.offsets]
+            position = self.size
+            while True:
+                block = fin.read(BUFFER_SIZE)
+                if not block:
+                    break
+                # newlines[j] ends the line num_lines + j and the next line starts after it
+                newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10)
+                numbers = self.num_lines + 1 + np.arange(newlines.size)
+                offsets.append(position + 1 + newlines[numbers % self.step == 0])
+                self.num_lines += newlines.size
+                if newlines.size:
+                    self.size = position + int(newlines[-1]) + 1
+                position += len(block)
+            self.offsets = np.concatenate(offsets).astype(np.int64)
+            self.checksum = self._tail_checksum(fin, self.size)
+            self.scanned = position
+        self._save()
+        return self
+
+    def __len__(self) -> int:
+        # the last line might not end with a newline
+        return self.num_lines + (self._file_size > self.size)
+
+    def _seek(self, fin: BinaryIO, num: int) -> None:
+        fin.seek(int(self.offsets[num // self.step]))
+        for _ in range(num % self.step):
+            fin.readline()
+
+    def lines(self, start: int, stop: int) -> List[str]:
+        """Read lines in the range [start, stop).
+
+        :param start: The line number (0-based) to start reading from.
+        :param stop: The line number to stop reading at.
+        :return: A list of lines (with newlines).
+        """
+        start = max(start, 0)
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+        with open(self.path, "rb") as fin:
+            self._seek(fin, start)
+            return [fin.readline().decode(self.encoding) for _ in range(stop - start)]
+
+    def line(self, num: int) -> str:
+        """Read a line.
+
+        :param num: The line number (0-based, negative values count from the end).
+        :return: The line (with the newline).
+        :raises IndexError: If the line number is out of range.
+        """
+        if num < 0:
+            num += len(self)
+        if not 0 <= num < len(self):
+            raise IndexError(f"The line number {num} is out of range!")
+        return self.lines(num, num + 1)[0]
+
+    def head(self, num: int = 10) -> List[str]:
+        """Read the first lines.
+
+        :param num: The number of lines to read.
+        :return: A list of lines.
+        """
+        return self.lines(0, num)
+
+    def tail(self, num: int = 10) -> List[str]:
+        """Read the last lines.
+
+        :param num: The number of lines to read.
+        :return: A list of lines.
+        """
+        return self.lines(len(self) - num, len(self))
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self.lines(start, stop)
+            return [self.line(num) for num in range(start, stop, step)]
+        return self.line(key)
+
+
+def _count_newlines(data, offset: int, count: int) -> int:
+    """Count newlines in a range of a buffer (e.g., a mmap object) without copying it.
+    The comparison of NumPy releases the GIL so that ranges can be counted by threads in parallel.
+
+    :param data: A buffer (e.g., a mmap object).
+    :param offset: The start of the range.
+    :param count: The number of bytes in the range.
+    :return: The number of newlines in the range.
+    """
+    return int(
+        np.count_nonzero(
+            np.frombuffer(data, dtype=np.uint8, count=count, offset=offset) == 10
+        )
+    )
+
+
+def count_lines(path: Union[str, Path], workers: int = 0) -> int:
+    """Count lines in a text file.
+    An uncompressed file is mapped into memory and newlines in blocks of it
+    are counted by a thread pool.
+    A compressed (gzip, bz2, zstd or xz) file is decompressed and counted as a stream.
+
+    :param path: The path to a text file.
+    :param workers: The number of threads (0 means the number of CPUs).
+    :return: The number of lines
+        (a last line not ending with a newline is counted as a line too).
+    """
+    if _detect_compression(path):
+        count = 0
+        last = b"\n"
+        with _open_input(path) as fin:
+            while True:
+                block = fin.read(BUFFER_SIZE)
+                if not block:
+                    return count + (last != b"\n")
+                count += block.count(b"\n")
+                last = block[-1:]
+    if os.path.getsize(path) == 0:
+        return 0
+    with open(path,
+              "rb") as fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        with ThreadPoolExecutor(
+            max_workers=workers if workers > 0 else None
+        ) as executor:
+            count = sum(
+                executor.map(
+                    lambda offset:
+                    _count_newlines(mm, offset, min(BUFFER_SIZE, size - offset)),
+                    range(0, size, BUFFER_SIZE)
+                )
+            )
+        return count + (mm[size - 1] != 10)
+
+
+def shard(path: Union[str, Path], num: int) -> List[Tuple[int, int]]:
+    """Split an (uncompressed) text file into byte ranges of (roughly) equal sizes
+    aligned to line starts so that the ranges can be read by parallel consumers without overlap.
+
+    :param path: The path to an uncompressed text file.
+    :param num: The number of shards.
+    :return: A list of num (possibly empty) byte ranges (start, end)
+        which can be read by iter_lines.
+    :raises ValueError: If the file is compressed.
+    """
+    if _detect_compression(path):
+        raise ValueError(f"The compressed file {path} cannot be sharded by bytes!")
+    size = os.path.getsize(path)
+    if size == 0:
+        return [(0, 0)] * num
+    bounds = [0]
+    with open(path,
+              "rb") as fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for idx in range(1, num):
+            target = max(size * idx // num, bounds[-1])
+            if target > 0:
+                # the first line starting at or after target
+                pos = mm.find(b"\n", target - 1)
+                target = size if pos < 0 else pos + 1
+            bounds.append(target)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def iter_lines(path: Union[str, Path],
+               start: int = 0,
+               end: Union[int, None] = None) -> Iterator[bytes]:
+    """Iterate lines (in bytes) starting in a byte range of an (uncompressed) text file.
+
+    :param path: The path to an uncompressed text file.
+    :param start: The start of the byte range (which should be a line start, e.g., from shard).
+    :param end: The end of the byte range (the end of the file if None).
+    :yield: Lines (with newlines) starting in the range [start, end).
+    """
+    with open(path, "rb") as fin:
+        fin.seek(start)
+        pos = start
         for line in fin:
-            line = line.strip()
-            if line == '"value_counts": {':
-                skip = True
+            if end is not None and pos >= end:
+                return
+            yield line
+            pos += len(line)
+
+
+def _resolve_files(path: Union[str, Path, List[Union[str, Path]]]) -> List[Path]:
+    """Resolve a file, a directory (of part files), a glob pattern or a list of files into files.
+
+    :param path: A file, a directory, a glob pattern or a list of files.
+    :return: A list of files (sorted naturally for a directory or a glob pattern).
+    """
+    if isinstance(path, (list, tuple)):
+        return [Path(p) for p in path]
+    if isinstance(path, str) and glob.has_magic(path):
+        return sorted(
+            (Path(p) for p in glob.glob(path) if os.path.isfile(p)), key=_natural_key
+        )
+    path = Path(path)
+    return _list_files(path) if path.is_dir() else [path]
+
+
+def _file_weight(
+    file: Path, weights: Union[Dict[str, float], Callable[[Path], float], None]
+) -> float:
+    """Get the sampling weight of (lines in) a file.
+
+    :param file: The path of a file.
+    :param weights: A dict mapping glob patterns of file names to weights,
+        a function mapping a file to its weight or None (all files have the weight 1).
+    :return: The weight of the file (1 if not matched).
+    """
+    if weights is None:
+        return 1.0
+    if callable(weights):
+        return float(weights(file))
+    for pattern, weight in weights.items():
+        if fnmatch.fnmatchcase(file.name, pattern):
+            return float(weight)
+    return 1.0
+
+
+def _sample_approximate(
+    files: List[Path], weights: List[float], k: int, header: bool, rng: random.Random
+) -> List[Tuple[int, int, bytes]]:
+    """Sample lines approximately by seeking to random byte offsets.
+    A file is chosen with a probability proportional to its size times its weight
+    and the line following a random offset in it is taken.
+    Lines following long lines are more likely to be sampled.
+
+    :param files: A list of uncompressed files.
+    :param weights: Weights of the files.
+    :param k: The number of lines to sample (with replacement).
+    :param header: Whether each file has a header line.
+    :param rng: The random number generator.
+    :return: A list of tuples (file index, offset, line).
+    """
+    sizes = [os.path.getsize(file) for file in files]
+    if not any(size * weight for size, weight in zip(sizes, weights)):
+        return []
+    picks = rng.choices(
+        range(len(files)),
+        weights=[size * weight for size, weight in zip(sizes, weights)],
+        k=k
+    )
+    samples = []
+    for idx in sorted(set(picks)):
+        with open(files[idx], "rb") as fin:
+            start = len(fin.readline()) if header else 0
+            for _ in range(picks.count(idx)):
+                offset = rng.randrange(start, sizes[idx])
+                # take the line starting after the random offset (wrapping around at the end)
+                fin.seek(offset)
+                if offset > start:
+                    fin.readline()
+                if fin.tell() >= sizes[idx]:
+                    fin.seek(start)
+                position = fin.tell()
+                line = fin.readline()
+                if line:
+                    samples.append((idx, position, line))
+    return samples
+
+
+def _sample_exact(
+    files: List[Path], weights: List[float], k: int, header: bool, rng: random.Random
+) -> List[Tuple[int, int, bytes]]:
+    """Sample lines (without replacement) in a single pass
+    using weighted reservoir sampling with exponential jumps (A-ExpJ).
+    Since the weight is constant in a file,
+    lines skipped by a jump are consumed at C speed (via itertools.islice) without keys.
+    With equal weights, this is the uniform reservoir sampling.
+
+    :param files: A list of (possibly compressed) files.
+    :param weights: Weights of the files.
+    :param k: The number of lines to sample.
+    :param header: Whether each file has a header line.
+    :param rng: The random number generator.
+    :return: A list of tuples (file index, line number, line).
+    """
+    # a min-heap of (key, file index, line number, line)
+    heap = []
+    # the remaining weight to jump over before the next line enters the reservoir
+    jump = None
+    for idx, (file, weight) in enumerate(zip(files, weights)):
+        if weight <= 0:
+            continue
+        with _open_input(file) as fin:
+            if header:
+                fin.readline()
+            # line numbers are increasing (but not consecutive as the counter is also peeked)
+            counter = itertools.count()
+            lines = zip(fin, counter)
+            while len(heap) < k:
+                item = next(lines, None)
+                if item is None:
+                    break
+                line, num = item
+                heapq.heappush(heap, (rng.random()**(1 / weight), idx, num, line))
+            if len(heap) < k:
                 continue
-            if skip:
-                if line in ("}", "},"):
-                    skip = False
+            if jump is None:
+                jump = math.log(rng.random()) / math.log(heap[0][0])
+            while True:
+                # lines whose cumulative weight does not exceed the jump are skipped
+                skip = max(math.ceil(jump / weight) - 1, 0)
+                start = next(counter)
+                item = next(itertools.islice(lines, skip, None), None)
+                if item is None:
+                    jump -= (next(counter) - start - 1) * weight
+                    break
+                jump -= (skip + 1) * weight
+                line, num = item
+                threshold = heap[0][0]**weight
+                key = rng.uniform(threshold, 1)**(1 / weight)
+                heapq.heapreplace(heap, (key, idx, num, line))
+                jump = math.log(rng.random()) / math.log(heap[0][0])
+    return [(idx, num, line) for _, idx, num, line in heap]
+
+
+def sample(
+    path: Union[str, Path, List[Union[str, Path]]],
+    k: int,
+    header: bool = False,
+    seed: Union[int, None] = None,
+    weights: Union[Dict[str, float], Callable[[Path], float], None] = None,
+    approximate: bool = False,
+    output: Union[str, Path, None] = None,
+    compresslevel: Union[int, None] = None,
+    threads: int = 0
+) -> List[str]:
+    """Sample lines from a file, a directory (of part files) or a glob pattern
+    in a single pass using reservoir sampling.
+
+    :param path: A file, a directory, a glob pattern (e.g., data/part-*) or a list of files.
+    :param k: The number of lines to sample. If 0, only the header (if any) is returned.
+    :param header: Whether each file has a header line.
+        If True, the header (of the first non-empty file) is kept
+        as the first line of the sample.
+    :param seed: The seed of the random number generator.
+    :param weights: A dict mapping glob patterns of file names to weights
+        or a function mapping a file to its weight (of each line in it).
+        All lines have the same weight if None.
+    :param approximate: If True, lines following random byte offsets are sampled (with replacement)
+        instead of reading all lines, which is much faster for huge files
+        but biased towards lines following long lines.
+        This requires files to be uncompressed.
+    :param output: The path of the output file (if not None).
+        If empty, then output to the standard output.
+    :param compresslevel: The compression level for compressed output.
+    :param threads: The number of threads for compressing output (where supported).
+    :return: Sampled lines (in the order of their positions in files).
+    :raises ValueError: If k is negative
+        or if approximate is True and any of the files is compressed.
+    """
+    if k < 0:
+        raise ValueError(f"The number of lines to sample must be non-negative: {k}")
+    files = _resolve_files(path)
+    weights = [_file_weight(file, weights) for file in files]
+    rng = random.Random(seed)
+    first_line = b""
+    if header:
+        # the header is taken from the first non-empty file regardless of weights
+        for file in files:
+            with _open_input(file) as fin:
+                first_line = fin.readline()
+            if first_line:
+                break
+    if k == 0:
+        samples = []
+    elif approximate:
+        if any(_detect_compression(file) for file in files):
+            raise ValueError(
+                "The approximate sampling does not support compressed files!"
+            )
+        samples = _sample_approximate(files, weights, k, header, rng)
+    else:
+        samples = _sample_exact(files, weights, k, header, rng)
+    samples.sort(key=lambda sample: sample[:2])
+    lines = ([first_line] if first_line else []) + [line for _, _, line in samples]
+    if output is not None:
+        with _open_output(output, compresslevel, threads) as fout:
+            fout.writelines(
+                line if line.endswith(b"\n") else line + b"\n" for line in lines
+            )
+    return [line.decode("utf-8", errors="replace") for line in lines]
+
+
+def _widen_type(old, new):
+    """Get the narrowest type which can represent values of both types.
+
+    :param old: A pyarrow.DataType.
+    :param new: Another pyarrow.DataType.
+    :return: The widened pyarrow.DataType.
+    """
+    if old == new:
+        return old
+    if pa.types.is_null(old):
+        return new
+    if pa.types.is_null(new):
+        return old
+    if pa.types.is_integer(old) and pa.types.is_integer(new):
+        return pa.int64()
+    if (pa.types.is_integer(old) or pa.types.is_floating(old)
+       ) and (pa.types.is_integer(new) or pa.types.is_floating(new)):
+        return pa.float64()
+    return pa.string()
+
+
+def _value_type(value: str):
+    """Get the (narrowest) type of a value in a delimited file.
+
+    :param value: A value in a delimited file.
+    :return: A pyarrow.DataType.
+    """
+    for type_, parse in ((pa.int64(), int), (pa.float64(), float)):
+        try:
+            parse(value)
+            return type_
+        except ValueError:
+            pass
+    return pa.string()
+
+
+class _SchemaState:
+    """The shared (and widened on conversion errors) schema of delimited files
+    converted concurrently.
+    """
+    def __init__(self, schema):
+        self.types = dict(zip(schema.names, schema.types))
+        self._lock = threading.Lock()
+
+    def get(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.types)
+
+    def widen(self, name: str, type_) -> None:
+        with self._lock:
+            self.types[name] = _widen_type(self.types[name], type_)
+
+    def schema(self):
+        with self._lock:
+            return pa.schema(list(self.types.items()))
+
+
+def _infer_csv_schema(file: Path, delimiter: str, sample_bytes: int):
+    """Infer the schema of a delimited file from a sample (of complete records) at its beginning.
+
+    :param file: The path to a (possibly compressed) delimited file.
+    :param delimiter: The delimiter of fields.
+    :param sample_bytes: The size of the sample in bytes.
+    :return: A pyarrow.Schema.
+    """
+    with _open_input(file) as fin:
+        data = fin.read(sample_bytes)
+        if fin.read(1):
+            data = data[:_record_boundary(data)]
+    if not data.strip():
+        return pa.schema([])
+    return pacsv.read_csv(
+        io.BytesIO(data),
+        parse_options=pacsv.ParseOptions(delimiter=delimiter, newlines_in_values=True),
+    ).schema
+
+
+def _convert_types(array, type_):
+    """Get the type to which an array of strings can be converted,
+    widening the given type if necessary.
+
+    :param array: A pyarrow.Array of strings.
+    :param type_: The current pyarrow.DataType of the column.
+    :return: The (possibly widened) pyarrow.DataType.
+    """
+    candidates = [type_]
+    if pa.types.is_integer(type_):
+        candidates.append(pa.float64())
+    for candidate in candidates:
+        try:
+            array.cast(candidate)
+            return candidate
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+    return pa.string()
+
+
+def _scan_csv_types(file: Path, types: Dict[str, Any],
+                    delimiter: str) -> Dict[str, Any]:
+    """Scan a whole delimited file (with all columns read as strings)
+    for the types to which its columns can be converted.
+
+    :param file: The path to a (possibly compressed) delimited file.
+    :param types: The current types (pyarrow.DataType) of columns.
+    :param delimiter: The delimiter of fields.
+    :return: The widened types of columns.
+    """
+    types = dict(types)
+    with _open_input(file) as fin:
+        reader = pacsv.open_csv(
+            fin,
+            read_options=pacsv.ReadOptions(block_size=BUFFER_SIZE),
+            parse_options=pacsv.ParseOptions(
+                delimiter=delimiter, newlines_in_values=True
+            ),
+            convert_options=pacsv.ConvertOptions(
+                column_types=dict.fromkeys(types, pa.string()),
+                include_columns=list(types),
+                include_missing_columns=True,
+                strings_can_be_null=True,
+            ),
+        )
+        for batch in reader:
+            for name, array in zip(batch.schema.names, batch.columns):
+                if not pa.types.is_string(types[name]):
+                    types[name] = _convert_types(array, types[name])
+    return types
+
+
+def _write_row_groups(writer, table, group_rows: int, final: bool = False):
+    """Write full row groups from a table of accumulated rows.
+
+    :param writer: A pyarrow.parquet.ParquetWriter.
+    :param table: A pyarrow.Table of accumulated rows.
+    :param group_rows: The number of rows in each row group.
+    :param final: Whether these are the last rows of the file.
+        The rows left over are merged into the last row group if they are fewer than
+        half of a row group so that the last row group is never tiny.
+    :return: A table of the rows which are not written yet.
+    """
+    while table.num_rows >= 2 * group_rows or (
+        final and table.num_rows >= 1.5 * group_rows
+    ):
+        writer.write_table(table.slice(0, group_rows), row_group_size=group_rows)
+        table = table.slice(group_rows)
+    if final and table.num_rows:
+        writer.write_table(table, row_group_size=table.num_rows)
+        table = table.slice(table.num_rows)
+    return table
+
+
+def _csv_file_to_parquet(
+    file: Path, output: Path, state: _SchemaState, delimiter: str, row_group_bytes: int,
+    compression: str
+):
+    """Convert a delimited file to a Parquet file in a streaming way.
+    If a value cannot be converted to the type of its column,
+    the whole file is scanned (with all columns read as strings) for the types of all columns,
+    the types are widened (int64 -> float64 -> string) in the shared schema
+    and the conversion of the file is restarted (once).
+
+    :param file: The path to a (possibly compressed) delimited file.
+    :param output: The path of the Parquet file.
+    :param state: The shared schema.
+    :param delimiter: The delimiter of fields.
+    :param row_group_bytes: The (approximate) size of each row group in bytes.
+    :param compression: The compression codec of the Parquet file.
+    :return: The schema (pyarrow.Schema) of the Parquet file.
+    """
+    with _open_input(file) as fin:
+        names = next(
+            csv.reader(
+                [fin.readline().decode("utf-8").rstrip("\r\n")], delimiter=delimiter
+            ), []
+        )
+    scanned = False
+    while True:
+        types = state.get()
+        schema = pa.schema(list(types.items()))
+        if not names:
+            pq.write_table(schema.empty_table(), output, compression=compression)
+            return schema
+        try:
+            with _open_input(file) as fin, pq.ParquetWriter(
+                output, schema, compression=compression
+            ) as writer:
+                reader = pacsv.open_csv(
+                    fin,
+                    read_options=pacsv.ReadOptions(block_size=BUFFER_SIZE),
+                    parse_options=pacsv.ParseOptions(
+                        delimiter=delimiter, newlines_in_values=True
+                    ),
+                    convert_options=pacsv.ConvertOptions(
+                        column_types=types,
+                        include_columns=schema.names,
+                        include_missing_columns=True,
+                    ),
+                )
+                table = schema.empty_table()
+                group_rows = None
+                for batch in reader:
+                    if group_rows is None and batch.num_rows:
+                        group_rows = max(
+                            row_group_bytes * batch.num_rows // max(batch.nbytes, 1), 1
+                        )
+                    table = pa.concat_tables(
+                        [table, pa.Table.from_batches([batch], schema)]
+                    )
+                    if group_rows:
+                        table = _write_row_groups(writer, table, group_rows)
+                if group_rows:
+                    _write_row_groups(writer, table, group_rows, final=True)
+            return schema
+        except pa.ArrowInvalid as err:
+            widened = {}
+            if not scanned:
+                # find the failing column(s) directly by reading the file as strings
+                # (rather than relying on the wording of the error)
+                # and widen all columns at once so that the file is restarted only once
+                scanned = True
+                logger.info("Scanning {} for the types of columns...", file)
+                widened = _scan_csv_types(file, types, delimiter)
+                widened = {
+                    name: type_
+                    for name, type_ in widened.items() if type_ != types[name]
+                }
+            if not widened:
+                # the scan found nothing to widen, e.g., the CSV converter of pyarrow
+                # is stricter than casting, so fall back to the value in the error
+                match = CSV_CONVERSION_ERROR.search(str(err))
+                if match is None or int(match.group(1)) >= len(names):
+                    raise
+                name = names[int(match.group(1))]
+                type_ = _widen_type(types[name], _value_type(match.group(2)))
+                if type_ != types[name]:
+                    widened[name] = type_
+            if not widened:
+                raise
+            logger.info(
+                "Widening the columns {} and restarting the conversion of {}...",
+                widened, file
+            )
+            for name, type_ in widened.items():
+                state.widen(name, type_)
+
+
+def csv_to_parquet(
+    path: Union[str, Path, List[Union[str, Path]]],
+    output: Union[str, Path],
+    delimiter: str = ",",
+    sample_bytes: int = 16 * 1024**2,
+    row_group_bytes: int = 64 * 1024**2,
+    compression: str = "snappy",
+    workers: int = 0
+) -> Path:
+    """Convert delimited files (with headers) into Parquet files in a streaming way.
+    The schema is inferred from a sample at the beginning of each file
+    and reconciled across files (e.g., int64 and float64 are unified into float64).
+    Files are then streamed in blocks (so that memory stays bounded regardless of file sizes)
+    and converted concurrently.
+    If a value cannot be converted to the type of its column,
+    the type is widened (int64 -> float64 -> string) and the conversion of the file is restarted.
+    Parquet files written before a widening are converted again from their delimited files
+    with the final schema at the end (rather than cast, which is lossy,
+    e.g., 1.50 would become "1.5" when a float64 column is widened to string).
+    Compressed (gzip, bz2, zstd or xz) input files are decompressed transparently.
+
+    :param path: A file, a directory (of part files), a glob pattern or a list of files.
+    :param output: The path of the Parquet file if there is a single input file
+        and output ends with .parquet.
+        Otherwise, a directory into which part-*.parquet files are written.
+    :param delimiter: The delimiter (a single character) of fields.
+    :param sample_bytes: The size (in bytes) of the sample of each file for inferring schemas.
+    :param row_group_bytes: The (approximate) size of each row group in bytes.
+    :param compression: The compression codec of Parquet files.
+    :param workers: The number of files to convert concurrently
+        (0 means the default of ThreadPoolExecutor).
+    :return: The path of the Parquet file or the directory of Parquet files.
+    """
+    files = _resolve_files(path)
+    output = Path(output)
+    if len(files) == 1 and output.suffix == ".parquet":
+        outputs = [output]
+        output.parent.mkdir(parents=True, exist_ok=True)
+    else:
+        output.mkdir(parents=True, exist_ok=True)
+        outputs = [output / f"part-{idx:05d}.parquet" for idx in range(len(files))]
+    max_workers = workers if workers > 0 else None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        schemas = list(
+            executor.map(
+                lambda file: _infer_csv_schema(file, delimiter, sample_bytes), files
+            )
+        )
+    types = {}
+    for schema in schemas:
+        for name, type_ in zip(schema.names, schema.types):
+            types[name] = _widen_type(types[name], type_) if name in types else type_
+    state = _SchemaState(pa.schema(list(types.items())))
+    pending = list(range(len(files)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending:
+            schemas = list(
+                executor.map(
+                    lambda idx: _csv_file_to_parquet(
+                        files[idx], outputs[idx], state, delimiter, row_group_bytes,
+                        compression
+                    ), pending
+                )
+            )
+            # files converted before a column was widened (by another file)
+            # are converted again with the final schema
+            schema = state.schema()
+            pending = [
+                idx
+                for idx, schema_ in zip(pending, schemas) if not schema_.equals(schema)
+            ]
+    return output
+
+
+def _open_lines(path: Union[str, Path]) -> TextIO:
+    """Open a (possibly compressed) text file for reading lines terminated by "\n" only
+    (other line boundaries such as "\r" are kept inside lines as they are).
+
+    :param path: The path to a (possibly compressed) text file.
+    :return: A file object for reading text.
+    """
+    return io.TextIOWrapper(
+        _open_input(path), encoding="utf-8", errors="surrogateescape", newline="\n"
+    )
+
+
+def _is_sorted(path: Union[str, Path], key: Callable[[str], Any], header: bool) -> bool:
+    """Check whether lines of a file are sorted by a key (in a streaming way).
+
+    :param path: The path to a (possibly compressed) text file.
+    :param key: The key function.
+    :param header: Whether the file has a header line.
+    :return: True if the lines are sorted (in the ascending order) and False otherwise.
+    """
+    with _open_lines(path) as fin:
+        if header:
+            fin.readline()
+        last = None
+        for line in fin:
+            current = key(line)
+            if last is not None and current < last:
+                return False
+            last = current
+    return True
+
+
+def _iter_sorted(
+    path: Union[str, Path], index: List[int], delimiter: str, header: bool,
+    numeric: bool, assume_sorted: bool, sorted_path: str
+) -> Iterator[str]:
+    """Iterate lines (without the header) of a file sorted by a key.
+    The file is sorted using the external merge sort if it is not sorted.
+
+    :param path: The path to a (possibly compressed) text file.
+    :param index: Indexes of key fields (the whole line is the key if empty).
+    :param delimiter: The delimiter of fields.
+    :param header: Whether the file has a header line.
+    :param numeric: Whether to compare keys as numbers.
+    :param assume_sorted: Whether to assume that the file is sorted (without checking it).
+    :param sorted_path: The path of the sorted copy of the file (if it is not sorted).
+    :yield: Sorted lines (each of which ends with a newline).
+    """
+    if not assume_sorted and not _is_sorted(
+        path, _sort_key(index, delimiter, numeric), header
+    ):
+        logger.info("{} is not sorted, sorting it externally...", path)
+        sort(
+            path,
+            sorted_path,
+            key=index,
+            delimiter=delimiter,
+            header=header,
+            numeric=numeric,
+            tmp_dir=os.path.dirname(sorted_path)
+        )
+        path = sorted_path
+    with _open_lines(path) as fin:
+        if header:
+            fin.readline()
+        for line in fin:
+            yield line if line.endswith("\n") else line + "\n"
+
+
+def _read_first_line(path: Union[str, Path]) -> str:
+    with _open_lines(path) as fin:
+        return fin.readline()
+
+
+def _max_fields(path: Union[str, Path], delimiter: str) -> int:
+    """Get the maximum number of fields of lines in a delimited file.
+
+    :param path: The path to a (possibly compressed) delimited file.
+    :param delimiter: The delimiter of fields.
+    :return: The maximum number of fields.
+    """
+    with _open_lines(path) as fin:
+        return max((len(_split_fields(line, delimiter)) for line in fin), default=0)
+
+
+def _merge_walk(
+    left: Union[str, Path], right: Union[str, Path], index: Tuple[List[int], List[int]],
+    delimiter: str, header: bool, numeric: bool, assume_sorted: bool,
+    tmp_dir: Union[str, Path, None]
+) -> Iterator[Tuple[Any, List[str], List[str]]]:
+    """Walk 2 files sorted by keys in lockstep (in constant memory except for groups of equal keys).
+
+    :param left: The path to the left file.
+    :param right: The path to the right file.
+    :param index: Indexes of key fields of the left and right files.
+    :param delimiter: The delimiter of fields.
+    :param header: Whether the files have header lines.
+    :param numeric: Whether to compare keys as numbers.
+    :param assume_sorted: Whether to assume that the files are sorted (without checking them).
+    :param tmp_dir: The directory for temporary files (the default temporary directory if None).
+    :yield: Tuples (key, left lines, right lines) of groups of lines with the same key
+        in the ascending order of keys (one of the lists is empty if the key is missing from it).
+    """
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        groups = []
+        for side, path, idx in zip(("left", "right"), (left, right), index):
+            key = _sort_key(idx, delimiter, numeric)
+            lines = _iter_sorted(
+                path, idx, delimiter, header, numeric, assume_sorted,
+                os.path.join(tmp, f"sorted-{side}")
+            )
+            groups.append(
+                (value, list(group)) for value, group in itertools.groupby(lines, key)
+            )
+        left_groups, right_groups = groups
+        lgroup = next(left_groups, None)
+        rgroup = next(right_groups, None)
+        while lgroup is not None or rgroup is not None:
+            if rgroup is None or (lgroup is not None and lgroup[0] < rgroup[0]):
+                yield lgroup[0], lgroup[1], []
+                lgroup = next(left_groups, None)
+            elif lgroup is None or rgroup[0] < lgroup[0]:
+                yield rgroup[0], [], rgroup[1]
+                rgroup = next(right_groups, None)
             else:
-                fout.write(line)
-    logger.info("The pruned JSON file is written to {}.", output)
+                yield lgroup[0], lgroup[1], rgroup[1]
+                lgroup = next(left_groups, None)
+                rgroup = next(right_groups, None)
+
+
+def _write_lines(
+    lines: Iterator[str],
+    output: Union[str, Path, None],
+    compresslevel: Union[int, None] = None,
+    threads: int = 0
+) -> Iterator[str]:
+    """Write lines into a file or return them as an iterator.
+
+    :param lines: An iterator of lines.
+    :param output: The path of the output file.
+        If None, lines are returned as an iterator.
+        If empty, then output to the standard output.
+    :param compresslevel: The compression level for compressed output.
+    :param threads: The number of threads for compressing output (where supported).
+    :return: An iterator of lines if output is None and None otherwise.
+    """
+    if output is None:
+        return lines
+    with _open_output(output, compresslevel, threads) as fout:
+        writer = io.TextIOWrapper(
+            fout, encoding="utf-8", errors="surrogateescape", newline=""
+        )
+        writer.writelines(lines)
+        # detach (instead of close) so that the output is closed by its own context manager
+        writer.detach()
+    return None
+
+
+def _set_operation(
+    operation: str,
+    left: Union[str, Path],
+    right: Union[str, Path],
+    output: Union[str, Path, None],
+    key: Union[int, str, Sequence[Union[int, str]], None],
+    delimiter: str,
+    header: bool,
+    numeric: bool,
+    assume_sorted: bool,
+    tmp_dir: Union[str, Path, None],
+    compresslevel: Union[int, None],
+    threads: int,
+) -> Union[Iterator[str], None]:
+    """Apply a set operation (intersect, difference or union) on lines of 2 files by keys.
+    Please refer to intersect for details of parameters.
+    """
+    first_line = _read_first_line(left) if header else ""
+    index = (
+        _key_index(key, _split_fields(first_line, delimiter)),
+        _key_index(
+            key,
+            _split_fields(_read_first_line(right), delimiter) if header else []
+        ),
+    )
+    walk = _merge_walk(
+        left, right, index, delimiter, header, numeric, assume_sorted, tmp_dir
+    )
+    if operation == "intersect":
+        lines = (line for _, llines, rlines in walk if rlines for line in llines)
+    elif operation == "difference":
+        lines = (line for _, llines, rlines in walk if not rlines for line in llines)
+    else:
+        lines = ((llines or rlines)[0] for _, llines, rlines in walk)
+    if first_line:
+        lines = itertools.chain(
+            [first_line if first_line.endswith("\n") else first_line + "\n"], lines
+        )
+    return _write_lines(lines, output, compresslevel, threads)
+
+
+def intersect(
+    left: Union[str, Path],
+    right: Union[str, Path],
+    output: Union[str, Path, None] = None,
+    key: Union[int, str, Sequence[Union[int, str]], None] = None,
+    delimiter: str = ",",
+    header: bool = False,
+    numeric: bool = False,
+    assume_sorted: bool = False,
+    tmp_dir: Union[str, Path, None] = None,
+    compresslevel: Union[int, None] = None,
+    threads: int = 0,
+) -> Union[Iterator[str], None]:
+    """Keep lines of the left file whose keys occur in the right file (like comm -12 or a semi join).
+    Files sorted by keys are merged in a streaming way (in constant memory)
+    and a file is sorted using the external merge sort (into a temporary file) if it is not sorted.
+
+    :param left: The path to the left (possibly compressed) file.
+    :param right: The path to the right (possibly compressed) file.
+    :param output: The path of the output file.
+        If None, lines are returned as an iterator.
+        If empty, then output to the standard output.
+    :param key: Key columns (0-based indexes or names if there are headers).
+        The whole line is the key if None.
+    :param delimiter: The delimiter (a single character) of fields.
+    :param header: Whether the files have header lines (the header of the left file is kept).
+    :param numeric: Whether to compare keys as numbers.
+    :param assume_sorted: Whether to assume that the files are sorted by keys (without checking them).
+    :param tmp_dir: The directory for temporary files (the default temporary directory if None).
+    :param compresslevel: The compression level for compressed output.
+    :param threads: The number of threads for compressing output (where supported).
+    :return: An iterator of lines (including the header) if output is None and None otherwise.
+    """
+    return _set_operation(
+        "intersect", left, right, output, key, delimiter, header, numeric,
+        assume_sorted, tmp_dir, compresslevel, threads
+    )
+
+
+def difference(
+    left: Union[str, Path],
+    right: Union[str, Path],
+    output: Union[str, Path, None] = None,
+    key: Union[int, str, Sequence[Union[int, str]], None] = None,
+    delimiter: str = ",",
+    header: bool = False,
+    numeric: bool = False,
+    assume_sorted: bool = False,
+    tmp_dir: Union[str, Path, None] = None,
+    compresslevel: Union[int, None] = None,
+    threads: int = 0,
+) -> Union[Iterator[str], None]:
+    """Keep lines of the left file whose keys do not occur in the right file
+    (like comm -23 or an anti join).
+    Please refer to intersect for details of parameters.
+    """
+    return _set_operation(
+        "difference", left, right, output, key, delimiter, header, numeric,
+        assume_sorted, tmp_dir, compresslevel, threads
+    )
+
+
+def union(
+    left: Union[str, Path],
+    right: Union[str, Path],
+    output: Union[str, Path, None] = None,
+    key: Union[int, str, Sequence[Union[int, str]], None] = None,
+    delimiter: str = ",",
+    header: bool = False,
+    numeric: bool = False,
+    assume_sorted: bool = False,
+    tmp_dir: Union[str, Path, None] = None,
+    compresslevel: Union[int, None] = None,
+    threads: int = 0,
+) -> Union[Iterator[str], None]:
+    """Merge lines of 2 files keeping only the first line (preferring the left file) of each key
+    (like sort -u -m).
+    Please refer to intersect for details of parameters.
+    """
+    return _set_operation(
+        "union", left, right, output, key, delimiter, header, numeric, assume_sorted,
+        tmp_dir, compresslevel, threads
+    )
+
+
+def join(
+    left: Union[str, Path],
+    right: Union[str, Path],
+    output: Union[str, Path, None] = None,
+    key: Union[int, str, Sequence[Union[int, str]]] = 0,
+    how: str = "inner",
+    delimiter: str = ",",
+    header: bool = False,
+    numeric: bool = False,
+    assume_sorted: bool = False,
+    tmp_dir: Union[str, Path, None] = None,
+    compresslevel: Union[int, None] = None,
+    threads: int = 0,
+) -> Union[Iterator[str], None]:
+    """Join 2 delimited files by keys using a streaming merge join.
+    Each output row consists of fields of the left row followed by non-key fields of the right row.
+    Rows with the same key are joined pairwise (only a group of rows with the same key is in memory).
+    Rows of the left file are padded to the width of its header
+    (or of its widest row if there are no headers) so that right fields are aligned.
+    Please refer to intersect for details of other parameters.
+
+    :param key: Key columns (0-based indexes or names if there are headers).
+    :param how: The type of the join (inner, left, right or outer).
+        Fields missing from a side are empty.
+    :raises ValueError: If how is not supported.
+    """
+    if how not in ("inner", "left", "right", "outer"):
+        raise ValueError(f"The join type {how} is not supported!")
+    if header:
+        lnames = _split_fields(_read_first_line(left), delimiter)
+        rnames = _split_fields(_read_first_line(right), delimiter)
+        lwidth, rwidth = len(lnames), len(rnames)
+    else:
+        # rows might be ragged without headers, so use the widest row of each file
+        lnames = rnames = []
+        lwidth, rwidth = _max_fields(left, delimiter), _max_fields(right, delimiter)
+    lindex = _key_index(key, lnames)
+    rindex = _key_index(key, rnames)
+    lwidth = max([lwidth] + [idx + 1 for idx in lindex])
+    rwidth = max([rwidth] + [idx + 1 for idx in rindex])
+    rkeep = [idx for idx in range(rwidth) if idx not in rindex]
+    walk = _merge_walk(
+        left, right, (lindex, rindex), delimiter, header, numeric, assume_sorted,
+        tmp_dir
+    )
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\n")
+
+    def _format(fields: List[str]) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(fields)
+        return buffer.getvalue()
+
+    def _pad(fields: List[str], width: int) -> List[str]:
+        return fields + [""] * (width - len(fields))
+
+    def _join() -> Iterator[str]:
+        if header:
+            yield _format(lnames + [rnames[idx] for idx in rkeep])
+        for _, llines, rlines in walk:
+            lrows = [_pad(_split_fields(line, delimiter), lwidth) for line in llines]
+            rrows = [_split_fields(line, delimiter) for line in rlines]
+            if not rrows:
+                if how in ("left", "outer"):
+                    for lrow in lrows:
+                        yield _format(lrow + [""] * len(rkeep))
+                continue
+            if not lrows:
+                if how in ("right", "outer"):
+                    for rrow in rrows:
+                        lrow = [""] * lwidth
+                        for lidx, ridx in zip(lindex, rindex):
+                            lrow[lidx] = rrow[ridx] if ridx < len(rrow) else ""
+                        yield _format(
+                            lrow +
+                            [rrow[idx] if idx < len(rrow) else "" for idx in rkeep]
+                        )
+                continue
+            for lrow in lrows:
+                for rrow in rrows:
+                    yield _format(
+                        lrow + [rrow[idx] if idx < len(rrow) else "" for idx in rkeep]
+                    )
+
+    return _write_lines(_join(), output, compresslevel, threads)
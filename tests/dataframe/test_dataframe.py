@@ -1,11 +1,154 @@
 """Test dataframe.py.
 """
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
 import dsutil.dataframe
+
 BASE_DIR = Path(__file__).resolve().parent
 
 
 def test_read_csv():
     path = BASE_DIR / "data"
     df = dsutil.dataframe.read_csv(path)
-    assert df.shape == (2, 2)
\ No newline at end of file
+    assert df.shape == (2, 2)
+
+
+def test_profile_columns():
+    report = dsutil.dataframe.profile_columns(BASE_DIR / "data", chunksize=1)
+    assert report["rows"] == 2
+    assert report["columns"] == 2
+    stats = report["variables"]["n"]
+    assert stats["count"] == 2
+    assert stats["min"] == 1
+    assert stats["max"] == 2
+    assert stats["mean"] == 1.5
+    assert report["variables"]["cal_dt"]["distinct"] == 2
+
+
+def test_dump_profile_native_cache(tmp_path):
+    kwargs = {"title": "test", "cache_dir": tmp_path / "cache"}
+    report = dsutil.dataframe.dump_profile_native(
+        BASE_DIR / "data", output_dir=tmp_path / "out1", **kwargs
+    )
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+    cached = dsutil.dataframe.dump_profile_native(
+        BASE_DIR / "data", output_dir=tmp_path / "out2", **kwargs
+    )
+    assert cached == report
+    assert (tmp_path / "out2" / "report.html").is_file()
+
+
+def test_dump_profile(tmp_path):
+    pytest.importorskip("pandas_profiling")
+    kwargs = {"title": "test", "cache_dir": tmp_path / "cache"}
+    dsutil.dataframe.dump_profile(
+        BASE_DIR / "data", output_dir=tmp_path / "out1", **kwargs
+    )
+    for file in ("report.html", "report.json", "report.pickle"):
+        assert (tmp_path / "out1" / file).stat().st_size > 0
+    dsutil.dataframe.dump_profile(
+        BASE_DIR / "data", output_dir=tmp_path / "out2", **kwargs
+    )
+    assert (tmp_path / "out2" /
+            "report.json").read_text() == (tmp_path / "out1" /
+                                           "report.json").read_text()
+
+
+def test_optimize_dtypes():
+    frame = pd.DataFrame(
+        {
+            "int": range(100),
+            "float": [0.5] * 100,
+            "num_str": [str(i) for i in range(100)],
+            "cat": ["a", "b"] * 50,
+        }
+    )
+    frame = dsutil.dataframe.optimize_dtypes(frame)
+    assert frame.dtypes["int"] == np.int8
+    assert frame.dtypes["float"] == np.float32
+    assert frame.dtypes["num_str"] == np.int8
+    assert frame.dtypes["cat"] == "category"
+    assert frame["num_str"].sum() == 4950
+
+
+def test_optimize_dtypes_keep_formatted_numbers():
+    frame = pd.DataFrame(
+        {
+            "zip": ["00123", "02139", "90210"],
+            "signed": ["+1", "2", "3"],
+            "padded": [" 1", "2", "3"],
+            "num": ["-1.5", "0", "1e3"],
+        }
+    )
+    frame = dsutil.dataframe.optimize_dtypes(frame, category_ratio=0)
+    assert frame["zip"].tolist() == ["00123", "02139", "90210"]
+    assert frame["signed"].tolist() == ["+1", "2", "3"]
+    assert frame["padded"].tolist() == [" 1", "2", "3"]
+    assert frame["num"].tolist() == [-1.5, 0, 1000]
+
+
+def test_cache_frame(tmp_path):
+    calls = []
+
+    @dsutil.dataframe.cache_frame(cache_dir=tmp_path)
+    def make_frame(n):
+        calls.append(n)
+        return pd.DataFrame({"x": range(n), "y": range(n)})
+
+    assert make_frame(3).shape == (3, 2)
+    frame = make_frame(3, cache_columns=["y"])
+    assert frame.columns.tolist() == ["y"]
+    assert frame.y.tolist() == [0, 1, 2]
+    assert calls == [3]
+    make_frame.invalidate(3)
+    make_frame(3)
+    assert calls == [3, 3]
+    make_frame.clear()
+    assert not list(tmp_path.glob("*.parquet"))
+
+
+def test_cache_frame_threads(tmp_path):
+    @dsutil.dataframe.cache_frame(cache_dir=tmp_path)
+    def make_frame(n):
+        return pd.DataFrame({"x": range(n)})
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        frames = list(executor.map(make_frame, [1000] * 16))
+    assert all(frame.x.sum() == 499500 for frame in frames)
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_write_partitioned(tmp_path):
+    frame = pd.DataFrame({"key": ["a", "b", None] * 100, "value": range(300)})
+    path = dsutil.dataframe.write_partitioned(
+        frame, tmp_path / "output", partition_cols="key", target_file_bytes=256
+    )
+    assert (path / "_SUCCESS").is_file()
+    assert {p.name
+            for p in path.iterdir()
+            if p.is_dir()} == {"key=a", "key=b", "key=__HIVE_DEFAULT_PARTITION__"}
+    assert len(list((path / "key=a").glob("*.parquet"))) > 1
+    values = pd.concat(pd.read_parquet(file) for file in path.rglob("*.parquet")).value
+    assert sorted(values) == list(range(300))
+
+
+def test_write_partitioned_overwrite_failure(tmp_path, monkeypatch):
+    frame = pd.DataFrame({"value": range(10)})
+    path = dsutil.dataframe.write_partitioned(frame, tmp_path / "output")
+    rename = Path.rename
+
+    def fail_commit(self, target):
+        if self.name.startswith(".output.tmp-"):
+            raise OSError("injected failure")
+        return rename(self, target)
+
+    monkeypatch.setattr(Path, "rename", fail_commit)
+    with pytest.raises(OSError):
+        dsutil.dataframe.write_partitioned(frame.head(1), path, overwrite=True)
+    assert [p.name for p in tmp_path.iterdir()] == ["output"]
+    values = pd.concat(pd.read_parquet(file) for file in path.rglob("*.parquet")).value
+    assert sorted(values) == list(range(10))
@@ -0,0 +1,131 @@
+"""Test the module dsutil.memory.
+"""
+import time
+import shutil
+import pandas as pd
+import pytest
+import dsutil.memory
+
+
+def test_get_memory_usage():
+    assert dsutil.memory.get_memory_usage() > 0
+    usage = dsutil.memory.get_memory_usage_by_user()
+    assert usage[dsutil.memory.USER] > 0
+
+
+def test_get_process_memory_usage():
+    frame = dsutil.memory.get_process_memory_usage([dsutil.memory.USER])
+    assert not frame.empty
+    assert (frame.user == dsutil.memory.USER).all()
+    assert (frame.uss <= frame.rss).all()
+    assert dsutil.memory.get_memory_usage(metric="pss") > 0
+
+
+def _fake_process(proc, pid, pss):
+    # create the process directory aside and move it into place
+    # so that a reused pid gets a new inode (as in /proc)
+    path = proc / f".{pid}"
+    path.mkdir()
+    (path / "statm").write_text("100 10 0 0 0 0 0\n")
+    (path / "smaps_rollup"
+    ).write_text(f"Rss: {10 * dsutil.memory.PAGE_SIZE // 1024} kB\nPss: {pss} kB\n")
+    if (proc / pid).exists():
+        shutil.rmtree(proc / pid)
+    path.rename(proc / pid)
+
+
+def test_proc_memory_sampler_pid_reuse(tmp_path):
+    sampler = dsutil.memory.ProcMemorySampler(proc=str(tmp_path), max_age=3600)
+    _fake_process(tmp_path, "123", 8)
+    assert sum(sampler.sample(metric="pss").values()) == 8 * 1024
+    assert sum(sampler.sample(metric="pss").values()) == 8 * 1024
+    # the pid is reused by a new process with the same RSS
+    _fake_process(tmp_path, "123", 4)
+    assert sum(sampler.sample(metric="pss").values()) == 4 * 1024
+
+
+def test_memory_recorder(tmp_path):
+    prom = tmp_path / "memory.prom"
+    with dsutil.memory.MemoryRecorder(
+        interval=0.01, capacity=5, prometheus_file=prom, max_overhead=1
+    ) as recorder:
+        time.sleep(0.2)
+    assert len(recorder) == 5
+    summary = recorder.summary()
+    assert summary["peak"] >= summary["p50"] > 0
+    assert "dsutil_memory_usage_bytes{" in prom.read_text()
+    recorder.dump(tmp_path / "memory.csv")
+    assert pd.read_csv(tmp_path / "memory.csv").shape == (5, 2)
+
+
+def test_parse_args():
+    limit = dsutil.memory.get_memory_limit()
+    assert limit > 0
+    assert dsutil.memory.parse_args(["-p", "50"]).target == limit / 2
+    assert dsutil.memory.parse_args(["-m", "1.5"]).target == 1.5 * 1024**2
+
+
+def test_match_memory_usage(monkeypatch):
+    blocks = []
+    allocate = dsutil.memory._allocate
+
+    def _allocate(size):
+        blocks.append(allocate(size))
+        return blocks[-1]
+
+    base = 100 * 1024**2
+    usages = []
+
+    def get_memory_usage(user, metric):
+        usages.append(base + sum(len(block) for block in blocks if not block.closed))
+        return usages[-1]
+
+    monkeypatch.setattr(dsutil.memory, "_allocate", _allocate)
+    monkeypatch.setattr(dsutil.memory, "get_memory_usage", get_memory_usage)
+    target = base + 64 * 1024**2
+    dsutil.memory.match_memory_usage(target, interval=0.01, duration=0.5)
+    assert blocks
+    assert abs(usages[-1] - target) <= 0.01 * target
+    assert all(block.closed for block in blocks)
+
+
+def test_match_memory_usage_deprecated_args():
+    with pytest.warns(DeprecationWarning):
+        dsutil.memory.match_memory_usage(
+            dsutil.memory.get_memory_usage(), sleep_min=0.01, duration=0.05
+        )
+
+
+def test_memory_watchdog():
+    stats = []
+    watchdog = dsutil.memory.MemoryWatchdog()
+    watchdog.register(stats.append, usage=1E-9)
+    watchdog.check()
+    watchdog.check()
+    assert len(stats) == 1
+    assert stats[0]["current"] > 0
+    assert stats[0]["limit"] >= stats[0]["current"]
+
+
+def test_memory_watchdog_keeps_polling(monkeypatch):
+    calls = []
+    memory_stats = dsutil.memory._memory_stats
+
+    def _memory_stats(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OSError("cgroup not readable")
+        return memory_stats(*args)
+
+    monkeypatch.setattr(dsutil.memory, "_memory_stats", _memory_stats)
+    stats = []
+    with dsutil.memory.MemoryWatchdog(interval=0.01) as watchdog:
+        watchdog.register(stats.append, usage=1E-9)
+        for _ in range(500):
+            if stats:
+                break
+            time.sleep(0.01)
+    assert len(calls) > 1
+    assert len(stats) == 1
+    # the cgroup is resolved once
+    assert len(set(calls)) == 1
@@ -0,0 +1,31 @@
+"""Test the module dsutil.profiling.
+"""
+import sys
+import json
+import pytest
+import dsutil.profiling
+
+
+def test_memory_profile(tmp_path):
+    output = tmp_path / "profile.jsonl"
+    with dsutil.profiling.MemoryProfile("test", output=output, enabled=True) as prof:
+        data = [bytearray(1024) for _ in range(1000)]
+    assert prof.report["traced_peak"] >= 1024 * 1000
+    assert prof.report["top"]
+    assert json.loads(output.read_text())["label"] == "test"
+    del data
+    with dsutil.profiling.MemoryProfile("test", enabled=False) as prof:
+        pass
+    assert prof.report is None
+
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason="tracemalloc.reset_peak")
+def test_memory_profile_nested():
+    with dsutil.profiling.MemoryProfile("outer", enabled=True) as outer:
+        data = bytearray(10 * 1024**2)
+        del data
+        with dsutil.profiling.MemoryProfile("inner", enabled=True) as inner:
+            data = bytearray(1024**2)
+            del data
+    assert 1024**2 <= inner.report["traced_peak"] < 10 * 1024**2
+    assert outer.report["traced_peak"] >= 10 * 1024**2
@@ -0,0 +1,540 @@
+"""Test the module dsutil.text.
+"""
+import re
+import json
+import gzip
+import bz2
+import lzma
+import pytest
+import dsutil.text
+
+
+def _write_files(dir_, contents):
+    dir_.mkdir()
+    for idx, content in enumerate(contents):
+        (dir_ / f"part-{idx:05d}").write_bytes(content)
+    return dir_
+
+
+def test_merge_with_headers(tmp_path):
+    files = _write_files(tmp_path / "data", [b"a,b\n1,2\n", b"a,b\n3,4", b"a,b\n5,6\n"])
+    output = tmp_path / "merged"
+    dsutil.text.merge(sorted(files.iterdir()), output)
+    assert output.read_bytes() == b"a,b\n1,2\n3,45,6\n"
+    dsutil.text.merge(sorted(files.iterdir()), output, ensure_newline=True)
+    assert output.read_bytes() == b"a,b\n1,2\n3,4\n5,6\n"
+
+
+def test_merge_without_header(tmp_path):
+    files = _write_files(tmp_path / "data", [b"1,2\n", b"3,4", b"5,6\n"])
+    output = tmp_path / "merged"
+    dsutil.text.merge(sorted(files.iterdir()), output)
+    assert output.read_bytes() == b"1,2\n3,45,6\n"
+    dsutil.text.merge(sorted(files.iterdir()), output, ensure_newline=True)
+    assert output.read_bytes() == b"1,2\n3,4\n5,6\n"
+
+
+@pytest.mark.parametrize("header", [True, False])
+@pytest.mark.parametrize("ensure_newline", [True, False])
+def test_merge_parallel(tmp_path, header, ensure_newline):
+    contents = [b"1,2\n", b"", b"3,4", b"5,6\n7,8"]
+    if header:
+        contents = [b"a,b\n" + content for content in contents]
+    files = sorted(_write_files(tmp_path / "data", contents).iterdir())
+    dsutil.text.merge(files, tmp_path / "seq", ensure_newline=ensure_newline)
+    dsutil.text.merge(files, tmp_path / "par", ensure_newline=ensure_newline, workers=4)
+    assert (tmp_path / "par").read_bytes() == (tmp_path / "seq").read_bytes()
+
+
+def test_merge_compressed(tmp_path):
+    dir_ = tmp_path / "data"
+    dir_.mkdir()
+    (dir_ / "part-2.gz").write_bytes(gzip.compress(b"a,b\n3,4\n"))
+    (dir_ / "part-10.bz2").write_bytes(bz2.compress(b"a,b\n5,6\n"))
+    (dir_ / "part-1.xz").write_bytes(lzma.compress(b"a,b\n1,2\n"))
+    (dir_ / "_SUCCESS").write_bytes(b"")
+    assert dsutil.text.has_header(dir_)
+    output = tmp_path / "merged.gz"
+    dsutil.text.merge(dir_, output, workers=4)
+    assert gzip.decompress(output.read_bytes()) == b"a,b\n1,2\n3,4\n5,6\n"
+
+
+def test_merge_zstd(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    files = _write_files(tmp_path / "data", [b"a,b\n1,2\n", b"a,b\n3,4\n"])
+    output = tmp_path / "merged.zst"
+    dsutil.text.merge(files, output, compresslevel=1, threads=2)
+    output2 = tmp_path / "merged"
+    dsutil.text.merge([output], output2)
+    assert output2.read_bytes() == b"a,b\n1,2\n3,4\n"
+    assert zstandard.ZstdDecompressor().stream_reader(output.read_bytes()).read() == \
+        b"a,b\n1,2\n3,4\n"
+
+
+def test_dedup_header_compressed(tmp_path):
+    file = tmp_path / "data.gz"
+    file.write_bytes(gzip.compress(b"a,b\n1,2\na,b\n3,4\n"))
+    output = tmp_path / "dedup.bz2"
+    dsutil.text.dedup_header(file, output)
+    assert bz2.decompress(output.read_bytes()) == b"a,b\n1,2\n3,4\n"
+
+
+def _dedup_header_lines(data):
+    lines = data.splitlines(keepends=True)
+    return b"".join(lines[:1] + [line for line in lines[1:] if line != lines[0]])
+
+
+@pytest.mark.parametrize("compressed", [True, False])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_dedup_header(tmp_path, monkeypatch, compressed, workers):
+    monkeypatch.setattr(dsutil.text, "BUFFER_SIZE", 7)
+    monkeypatch.setattr(dsutil.text, "PARALLEL_CHUNK_SIZE", 11)
+    data = b"a,b\n1,2\na,b\na,b\n3,4\nxa,b\na,b\n5,6\na,b\na,b"
+    file = tmp_path / "data"
+    file.write_bytes(gzip.compress(data) if compressed else data)
+    output = tmp_path / "dedup"
+    dsutil.text.dedup_header(file, output, workers=workers)
+    assert output.read_bytes() == _dedup_header_lines(data)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_select(tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(dsutil.text, "BUFFER_SIZE", 5)
+    file = tmp_path / "data.csv"
+    file.write_bytes(b'a,b,c\n1,"x,\ny",3\n4,5\n\n7,"""q""",9')
+    output = tmp_path / "selected.csv"
+    dsutil.text.select(file, ["c", "b"], ",", output, workers=workers)
+    assert output.read_bytes() == b'c,b\n3,"x,\ny"\n,5\n9,"""q"""\n'
+    with pytest.raises(ValueError):
+        dsutil.text.select(file, ["c", "d"], ",", output)
+
+
+def test_select_stray_quote(tmp_path, monkeypatch):
+    monkeypatch.setattr(dsutil.text, "BUFFER_SIZE", 4)
+    monkeypatch.setattr(dsutil.text, "MAX_RECORD_SIZE", 16)
+    file = tmp_path / "data.csv"
+    rows = [b'a,b\n', b'5" pipe,1\n'] + [b"x,%d\n" % i for i in range(50)]
+    file.write_bytes(b"".join(rows))
+    with file.open("rb") as fin:
+        chunks = list(dsutil.text._iter_records(fin))
+    assert b"".join(chunks) == file.read_bytes()
+    assert max(map(len, chunks)) <= 16 + 4
+    output = tmp_path / "selected.csv"
+    dsutil.text.select(file, ["b"], ",", output)
+    assert output.read_bytes(
+    ) == b"".join([b"b\n1\n"] + [b"%d\n" % i for i in range(50)])
+
+
+def test_select_pyarrow(tmp_path):
+    pytest.importorskip("pyarrow")
+    file = tmp_path / "data.csv"
+    file.write_bytes(b'a,b,c\n1,"x,y",3\n4,5,6\n')
+    output = tmp_path / "selected.csv"
+    dsutil.text.select(file, ["c", "b"], ",", output, engine="pyarrow")
+    assert output.read_bytes() == b'"c","b"\n"3","x,y"\n"6","5"\n'
+
+
+@pytest.mark.parametrize("engine", ["python", "pyarrow"])
+def test_select_where(tmp_path, engine):
+    if engine == "pyarrow":
+        pytest.importorskip("pyarrow")
+    file = tmp_path / "data.csv"
+    file.write_bytes(
+        b"name,age,state\nann,31,CA\nbob,17,WA\ncat,45,NY\ndan,18,WA\neve,x,CA\n"
+    )
+    output = tmp_path / "selected.csv"
+    where = [
+        ("age", ">=", 18), ("state", "in", {"CA", "WA"}), ("name", "regex", "^[a-d]")
+    ]
+    dsutil.text.select(file, ["name"], ",", output, where=where, engine=engine)
+    assert output.read_bytes().replace(b'"', b"") == b"name\nann\ndan\n"
+    dsutil.text.filter_rows(file, [("age", "between", (17, 31))], ",", output)
+    assert output.read_bytes() == b"name,age,state\nann,31,CA\nbob,17,WA\ndan,18,WA\n"
+    dsutil.text.filter_rows(file, [("state", "==", "NY")], ",", output, workers=2)
+    assert output.read_bytes() == b"name,age,state\ncat,45,NY\n"
+    with pytest.raises(ValueError):
+        dsutil.text.filter_rows(file, [("state", "~", "NY")], ",", output)
+
+
+def test_select_where_engines_agree(tmp_path):
+    pytest.importorskip("pyarrow")
+    file = tmp_path / "data.csv"
+    file.write_bytes(
+        b"id,x\n1,5\n2, 5\n3,inf\n4,1_000\n5,+5\n6,.5e1\n7,nan\n8,5.\n9,\n"
+    )
+    outputs = []
+    for engine in ("python", "pyarrow"):
+        output = tmp_path / f"{engine}.csv"
+        dsutil.text.select(
+            file, ["id"], ",", output, where=[("x", "==", 5)], engine=engine
+        )
+        outputs.append(output.read_bytes().replace(b'"', b""))
+    assert outputs[0] == outputs[1] == b"id\n1\n5\n6\n8\n"
+
+
+@pytest.mark.parametrize("indent", [None, 4])
+def test_prune_json(tmp_path, monkeypatch, indent):
+    monkeypatch.setattr(dsutil.text, "JSON_BLOCK_SIZE", 3)
+    data = {
+        "table": {
+            "n": 10,
+            "value_counts": {
+                "a": 1
+            }
+        },
+        "variables":
+            {
+                "x": {
+                    "value_counts": {
+                        "a \"}": 2
+                    },
+                    "histogram": [1, 2],
+                    "mean": 1.5e-3
+                },
+                "y": {
+                    "histogram": {
+                        "bins": [[1], {}]
+                    },
+                    "tags": ["a,b", True, None]
+                },
+            },
+        "value_counts": [],
+    }
+    file = tmp_path / "report.json"
+    file.write_text(json.dumps(data, indent=indent))
+    dsutil.text.prune_json(file, keys=["value_counts", "variables.x.histogram"])
+    output = tmp_path / "report_prune.json"
+    assert json.loads(output.read_text()) == {
+        "table": {
+            "n": 10
+        },
+        "variables":
+            {
+                "x": {
+                    "mean": 1.5e-3
+                },
+                "y": {
+                    "histogram": {
+                        "bins": [[1], {}]
+                    },
+                    "tags": ["a,b", True, None]
+                },
+            },
+    }
+    assert " " not in output.read_text().replace("a,b", "")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sort(tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(dsutil.text, "MAX_MERGE_FILES", 2)
+    lines = [f"{idx % 7},{idx % 3},row{idx}\n" for idx in range(100)]
+    file = tmp_path / "data.csv"
+    file.write_text("x,y,z\n" + "".join(lines))
+    output = tmp_path / "sorted.csv"
+    dsutil.text.sort(file, output, header=True, memory=1000, workers=workers)
+    assert output.read_text() == "x,y,z\n" + "".join(sorted(lines))
+    dsutil.text.sort(
+        file, output, key=["y", 0], header=True, unique=True, reverse=True, memory=1000
+    )
+    expected = {}
+    for line in sorted(lines, key=lambda line: line.split(",")[1::-1], reverse=True):
+        expected.setdefault(tuple(line.split(",")[1::-1]), line)
+    assert output.read_text() == "x,y,z\n" + "".join(expected.values())
+
+
+@pytest.mark.parametrize(
+    "lines",
+    [
+        [b"b\x0cx\n", b"c\r\n", b"a\n"],
+        [b"b,1\r\n", b"a,2\r\n"],
+        [b"b \xe2\x80\xa8 x\n", b"a\n"],
+        [b"b\rz\x1c\x85\n", b"a\xff\n"],
+    ],
+)
+def test_sort_line_terminators(tmp_path, monkeypatch, lines):
+    monkeypatch.setattr(dsutil.text, "MAX_MERGE_FILES", 2)
+    file = tmp_path / "data.txt"
+    file.write_bytes(b"".join(lines * 3))
+    output = tmp_path / "sorted.txt"
+    # a tiny memory budget gives a run per line and multiple merge passes
+    dsutil.text.sort(file, output, key=0, memory=4)
+    assert output.read_bytes() == b"".join(line * 3 for line in sorted(lines))
+    dsutil.text.sort(file, output, unique=True)
+    assert output.read_bytes() == b"".join(sorted(lines))
+
+
+def test_sort_numeric(tmp_path):
+    file = tmp_path / "data.txt"
+    file.write_text("10\n9\nabc\n-1.5\n9")
+    output = tmp_path / "sorted.txt"
+    dsutil.text.sort(file, output, numeric=True)
+    assert output.read_text() == "-1.5\n9\n9\n10\nabc\n"
+    dsutil.text.sort(file, output, numeric=True, unique=True)
+    assert output.read_text() == "-1.5\n9\n10\nabc\n"
+    with pytest.raises(ValueError):
+        dsutil.text.sort(file, output, key="x")
+
+
+def test_line_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(dsutil.text, "BUFFER_SIZE", 10)
+    lines = [f"line {idx}\n" for idx in range(100)]
+    file = tmp_path / "data.txt"
+    file.write_text("".join(lines) + "partial")
+    index = dsutil.text.LineIndex(file, step=7)
+    assert len(index) == 101
+    assert index[0] == lines[0]
+    assert index[50] == lines[50]
+    assert index[-1] == "partial"
+    assert index[95:] == lines[95:] + ["partial"]
+    assert index.tail(2) == [lines[-1], "partial"]
+    with open(file, "a") as fout:
+        fout.write(" line\n" + "".join(lines))
+    index = dsutil.text.LineIndex(file, step=7)
+    assert len(index) == 201
+    assert index[100] == "partial line\n"
+    assert index[101::25] == lines[::25]
+    file.write_text("".join(lines[:10]))
+    assert dsutil.text.LineIndex(file, step=7).update().tail(1) == [lines[9]]
+
+
+def test_line_index_partial_line(tmp_path, monkeypatch):
+    file = tmp_path / "data.txt"
+    file.write_text("line 0\nline 1\npartial")
+    index = dsutil.text.LineIndex(file, step=1, index_dir=tmp_path / "index")
+    assert (tmp_path / "index" / "data.txt.lidx.npz").is_file()
+    saves = []
+    monkeypatch.setattr(dsutil.text.LineIndex, "_save", saves.append)
+    index.update()
+    dsutil.text.LineIndex(file, step=1, index_dir=tmp_path / "index")
+    assert not saves
+    with open(file, "a") as fout:
+        fout.write(" line\n")
+    monkeypatch.undo()
+    assert index.update()[2] == "partial line\n"
+
+
+def test_line_index_read_only(tmp_path):
+    file = tmp_path / "data.txt"
+    file.write_text("line 0\nline 1\n")
+    # the side file cannot be written into a "directory" which is a regular file
+    index = dsutil.text.LineIndex(file, step=1, index_dir=file)
+    assert index[1] == "line 1\n"
+    with open(file, "a") as fout:
+        fout.write("line 2\n")
+    assert index.update().tail(1) == ["line 2\n"]
+
+
+def test_count_lines_shard(tmp_path, monkeypatch):
+    monkeypatch.setattr(dsutil.text, "BUFFER_SIZE", 10)
+    data = b"".join(f"line {idx}\n".encode() for idx in range(100)) + b"partial"
+    file = tmp_path / "data.txt"
+    file.write_bytes(data)
+    assert dsutil.text.count_lines(file, workers=3) == 101
+    (tmp_path / "data.txt.gz").write_bytes(gzip.compress(data))
+    assert dsutil.text.count_lines(tmp_path / "data.txt.gz") == 101
+    (tmp_path / "empty.txt").write_bytes(b"")
+    assert dsutil.text.count_lines(tmp_path / "empty.txt") == 0
+    shards = dsutil.text.shard(file, 7)
+    assert len(shards) == 7
+    lines = [
+        line for start, end in shards
+        for line in dsutil.text.iter_lines(file, start, end)
+    ]
+    assert b"".join(lines) == data
+    assert lines == data.splitlines(keepends=True)
+
+
+def test_sample(tmp_path):
+    dir_ = _write_files(
+        tmp_path / "data", [
+            b"h\n" + b"".join(f"a{idx}\n".encode() for idx in range(50)),
+            gzip.compress(b"h\n" + b"".join(f"b{idx}\n".encode() for idx in range(50))),
+        ]
+    )
+    lines = dsutil.text.sample(dir_, 10, header=True, seed=0)
+    assert lines[0] == "h\n"
+    assert len(lines) == 11
+    assert lines == dsutil.text.sample(str(dir_ / "part-*"), 10, header=True, seed=0)
+    assert len(dsutil.text.sample(dir_, 1000, header=True)) == 101
+    lines = dsutil.text.sample(dir_, 10, header=True, weights={"part-00001": 0})
+    assert all(line.startswith("a") for line in lines[1:])
+    with pytest.raises(ValueError):
+        dsutil.text.sample(dir_, 10, approximate=True)
+    output = tmp_path / "sample.txt"
+    lines = dsutil.text.sample(
+        dir_ / "part-00000", 5, header=True, approximate=True, output=output
+    )
+    assert len(lines) == 6
+    assert output.read_text() == "".join(lines)
+    assert dsutil.text.sample(dir_, 0, header=True) == ["h\n"]
+    assert dsutil.text.sample(dir_, 0) == []
+    with pytest.raises(ValueError):
+        dsutil.text.sample(dir_, -1)
+
+
+def test_sample_header(tmp_path):
+    dir_ = _write_files(tmp_path / "data", [b"", b"h\n1\n2\n", b"h\n3\n"])
+    assert dsutil.text.sample(dir_, 10, header=True) == ["h\n", "1\n", "2\n", "3\n"]
+    lines = dsutil.text.sample(dir_, 10, header=True, weights={"part-00001": 0})
+    assert lines == ["h\n", "3\n"]
+
+
+def test_csv_to_parquet(tmp_path, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(dsutil.text, "BUFFER_SIZE", 64)
+    dir_ = _write_files(
+        tmp_path / "data", [
+            b"a,b,c\n" + b"1,x,1\n" * 20 + b"2.5,y,2\n",
+            gzip.compress(b"a,b,c\n" + b"3,z,3\n" * 20 + b"4,w,q\n"),
+        ]
+    )
+    output = dsutil.text.csv_to_parquet(
+        dir_, tmp_path / "parquet", sample_bytes=32, row_group_bytes=100
+    )
+    table = pq.read_table(output)
+    assert [str(type_)
+            for type_ in table.schema.types] == ["double", "string", "string"]
+    assert table.num_rows == 42
+    assert table.column("a").to_pylist()[20:22] == [2.5, 3.0]
+    assert table.column("c").to_pylist()[-2:] == ["3", "q"]
+    assert pq.ParquetFile(output / "part-00000.parquet").metadata.num_row_groups > 1
+    file = dsutil.text.csv_to_parquet(dir_ / "part-00000", tmp_path / "single.parquet")
+    assert pq.read_table(file).num_rows == 21
+
+
+def test_csv_to_parquet_widen_once(tmp_path, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(dsutil.text, "BUFFER_SIZE", 64)
+    file = tmp_path / "data.csv"
+    file.write_bytes(
+        b"a,b,c\n" + b"1,2,3\n" * 20 + b"1.5,2,3\n" + b"1,x,3\n" + b"1,2,3.5\n" * 9
+    )
+    opens = []
+    open_csv = dsutil.text.pacsv.open_csv
+
+    def _open_csv(*args, **kwargs):
+        opens.append(args[0])
+        return open_csv(*args, **kwargs)
+
+    monkeypatch.setattr(dsutil.text.pacsv, "open_csv", _open_csv)
+    output = dsutil.text.csv_to_parquet(
+        file, tmp_path / "data.parquet", sample_bytes=32, row_group_bytes=100
+    )
+    # the initial conversion, the scan for types and a single restart
+    assert len(opens) == 3
+    parquet = pq.ParquetFile(output)
+    assert [str(type_)
+            for type_ in parquet.schema_arrow.types] == ["double", "string", "double"]
+    sizes = [
+        parquet.metadata.row_group(idx).num_rows
+        for idx in range(parquet.metadata.num_row_groups)
+    ]
+    assert sum(sizes) == 31
+    assert len(sizes) > 1
+    assert min(sizes) * 2 >= max(sizes) - 1
+
+
+def test_csv_to_parquet_reconvert(tmp_path, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(dsutil.text, "BUFFER_SIZE", 64)
+    # the wording of conversion errors is not relied on
+    monkeypatch.setattr(dsutil.text, "CSV_CONVERSION_ERROR", re.compile("(?!)"))
+    dir_ = _write_files(
+        tmp_path / "data", [
+            b"a,b\n1.50,1\n1e3,2\n",
+            b"a,b\n" + b"1,2\n" * 20 + b"x,2\n",
+        ]
+    )
+    output = dsutil.text.csv_to_parquet(
+        dir_, tmp_path / "parquet", sample_bytes=32, row_group_bytes=100, workers=1
+    )
+    table = pq.read_table(output)
+    assert [str(type_) for type_ in table.schema.types] == ["string", "int64"]
+    # values converted before the widening keep their original text
+    assert table.column("a").to_pylist()[:2] == ["1.50", "1e3"]
+    assert table.column("a").to_pylist()[-1] == "x"
+
+
+def test_set_operations(tmp_path):
+    left = tmp_path / "left.csv"
+    left.write_text("id,x\n3,c\n1,a\n2,b\n2,bb\n")
+    right = tmp_path / "right.csv"
+    right.write_text("y,id\nq,2\nr,4\np,1")
+    kwargs = {"key": "id", "header": True, "numeric": True}
+    assert list(dsutil.text.intersect(left, right, **kwargs)) == [
+        "id,x\n", "1,a\n", "2,b\n", "2,bb\n"
+    ]
+    assert list(dsutil.text.difference(left, right, **kwargs)) == ["id,x\n", "3,c\n"]
+    output = tmp_path / "union.csv"
+    dsutil.text.union(left, left, output, key=0, header=True, assume_sorted=False)
+    assert output.read_text() == "id,x\n1,a\n2,b\n3,c\n"
+    assert list(dsutil.text.join(left, right, how="outer", **kwargs)) == [
+        "id,x,y\n", "1,a,p\n", "2,b,q\n", "2,bb,q\n", "3,c,\n", "4,,r\n"
+    ]
+    assert list(dsutil.text.join(left, right, how="inner",
+                                 **kwargs))[1:] == ["1,a,p\n", "2,b,q\n", "2,bb,q\n"]
+    with pytest.raises(ValueError):
+        dsutil.text.join(left, right, how="cross", **kwargs)
+
+
+def test_set_operations_line_terminators(tmp_path):
+    left = tmp_path / "left.txt"
+    left.write_bytes(b"c\r\na\rb\n")
+    right = tmp_path / "right.txt"
+    right.write_bytes(b"a\rb\nd\x0c\n")
+    output = tmp_path / "output.txt"
+    dsutil.text.union(left, right, output)
+    assert output.read_bytes() == b"a\rb\nc\r\nd\x0c\n"
+    dsutil.text.intersect(left, right, output)
+    assert output.read_bytes() == b"a\rb\n"
+
+
+def test_join_without_header(tmp_path):
+    left = tmp_path / "left.csv"
+    left.write_text("a\nb,2,x\n")
+    right = tmp_path / "right.csv"
+    right.write_text("p,1\nq,2\n")
+    assert list(dsutil.text.join(left, right, key=1,
+                                 how="outer")) == ["a,,,\n", ",1,,p\n", "b,2,x,q\n"]
+
+
+def test_set_operations_lines(tmp_path):
+    left = tmp_path / "left.txt"
+    left.write_text("b\na\nc\n")
+    right = tmp_path / "right.txt.gz"
+    right.write_bytes(gzip.compress(b"c\nd\nb\n"))
+    assert list(dsutil.text.intersect(left, right)) == ["b\n", "c\n"]
+    assert list(dsutil.text.difference(left, right)) == ["a\n"]
+    assert list(dsutil.text.union(left, right)) == ["a\n", "b\n", "c\n", "d\n"]
+
+
+def test_parallel_gzip_writer(tmp_path):
+    data = b"".join(f"line {idx}\n".encode() for idx in range(10000))
+    path = tmp_path / "data.gz"
+    with dsutil.text.ParallelGzipWriter(path, threads=3, block_size=1000) as fout:
+        fout.write(data[:5])
+        fout.write(memoryview(data)[5:])
+    assert gzip.decompress(path.read_bytes()) == data
+    with dsutil.text.ParallelGzipWriter(path):
+        pass
+    assert gzip.decompress(path.read_bytes()) == b""
+    files = _write_files(tmp_path / "data", [b"a,b\n1,2\n", b"a,b\n3,4\n"])
+    dsutil.text.merge(files, path, threads=2)
+    assert gzip.decompress(path.read_bytes()) == b"a,b\n1,2\n3,4\n"
+    dsutil.text.sort(files / "part-00001", path, header=True, threads=-1)
+    assert gzip.decompress(path.read_bytes()) == b"a,b\n3,4\n"
+    dsutil.text.union(
+        files / "part-00000",
+        files / "part-00001",
+        path,
+        header=True,
+        compresslevel=1,
+        threads=2
+    )
+    assert gzip.decompress(path.read_bytes()) == b"a,b\n1,2\n3,4\n"
+    dsutil.text.sample(files / "part-00000", 1, header=True, output=path, threads=2)
+    assert gzip.decompress(path.read_bytes()) == b"a,b\n1,2\n"
+    json_file = tmp_path / "data.json"
+    json_file.write_text('{"a": 1, "value_counts": [1, 2]}')
+    dsutil.text.prune_json(json_file, path, threads=2)
+    assert gzip.decompress(path.read_bytes()) == b'{"a":1}'